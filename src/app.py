@@ -1,44 +1,136 @@
+import os
+import json
 import time
-from flask import Flask, request, jsonify
+import threading
+from flask import Flask, Response, request, jsonify
 from concurrent.futures import ThreadPoolExecutor
 from config_loader import CONFIG
-from hardware import (
-    reset_usb_hub, 
-    reset_v4l2_driver, 
-    capture_both_cameras, 
-    resolve_camera_ports, 
-    is_invalid_image,
-    configure_camera
-)
+from camera_health import HEALTH, LEVEL_NONE, capture_with_recovery
+from worker_pool import get_pool
+from jobs import JOBS, DONE, FAILED
+from metrics import METRICS, RETRIES
+from archive import ARCHIVE
+from resources import get_plan, cpu_usage
+from station import STATION
+from warmup import LAST_REPORTS
 
+STARTED = time.monotonic()
 app = Flask(__name__)
-executor = ThreadPoolExecutor(max_workers=4)
 
-# Global state for async job management
-processing_future = None
-retry_future = None
-retry_attempted = False
+# Pin the API before the workers are forked and its threads started; capture threads move to their reserved cores
+PLAN = get_plan()
+PLAN.apply_api()
+executor = ThreadPoolExecutor(max_workers=PLAN.api_threads)
+
+# Warm inference workers load in the background while the API already answers;
+# cmd 3 is refused until they are ready, unless ACCEPT_BEFORE_READY opts in to capturing early
+get_pool().start()
+
+# Settings and limits edits are picked up without a restart (CONFIG_RELOAD_INTERVAL_S)
+CONFIG.watch()
+
+# Captures are serialized (one set of cameras); inference of earlier jobs keeps running meanwhile
+capture_lock = threading.Lock()
+
+def _find_job(data):
+    """Looks up the polled job by ID, or the latest job for clients that send no ID."""
+    job_id = (data.get("data") or {}).get("jobId")
+    if job_id:
+        return JOBS.get(job_id)
+    return JOBS.latest()
+
+def _archive_when_done(job, future, frames, retry=False):
+    """Hands the frames and their verdict to the audit archive once the pipeline finishes."""
+    if ARCHIVE is None:
+        return
+
+    def done(f):
+        if f.cancelled() or f.exception() is not None:
+            verdict = {"success": False, "reason": "Inference Engine Error"}
+        else:
+            verdict = f.result()["response"].get("data", {})
+        ARCHIVE.submit(frames, verdict, job_id=job.id, retry=retry, artwork=(job.data.get("data") or {}).get("idealArtworkPath"))
+
+    future.add_done_callback(done)
+
+def _start_retry(job):
+    """
+    Re-captures and re-runs the stages that did not pass, once per job.
+    Once a later cmd 3 has registered its job the cameras see the next part, so
+    the job is settled on its first verdict instead. Returns False when the
+    retry was already started elsewhere.
+    """
+    with job.lock:
+        if job.retry_attempted:
+            return False
+        job.retry_attempted = True
+
+    RETRIES.inc()
+    try:
+        # Stage-aware retry: keep the passing stages, re-capture only the cameras whose stages failed
+        from processor import run_pipeline, stages_to_retry, cameras_for
+        first_outcomes = job.future.result()["outcomes"]
+        retry_stages = stages_to_retry(first_outcomes)
+        cameras = cameras_for(retry_stages)
+
+        # Re-capture, starting from the configured recovery level (USB hub reset by default)
+        with capture_lock:
+            if JOBS.superseded(job):
+                job.settle()
+                return True
+            frames = capture_with_recovery(min_level=CONFIG.RETRY_RECOVERY_LEVEL, cameras=cameras)
+        if frames is None:
+            job.fail("Hardware Failure")
+            return True
+
+        # Offload to worker thread; the job's own cmd 3 data carries the artwork path
+        job.emit("captured", retry=True, cameras=list(cameras))
+        future = executor.submit(
+            run_pipeline, frames, job.data,
+            on_event=job.emit, stages=retry_stages, prior=first_outcomes
+        )
+        job.attach(future, retry=True)
+        _archive_when_done(job, future, frames, retry=True)
+    except Exception as e:
+        print(f"Retry Error: {e}")
+        job.fail(f"Retry Error: {e}")
+    return True
+
+def _retry_when_failed(job, future):
+    """Starts the retry server-side as soon as the first result fails, without waiting for a cmd 2 poll."""
+    def done(f):
+        if f.cancelled() or f.exception() is not None:
+            return
+        if not f.result()["response"].get("data", {}).get("success", False):
+            executor.submit(_start_retry, job)
+
+    future.add_done_callback(done)
 
 @app.route('/printcheck', methods=['POST'])
 def printcheck():
-    global processing_future, retry_future, retry_attempted
-
     data = request.json
     cmd_code = data["header"]["cmdCode"]
 
     # --- CMD 2: POLL STATUS & RETRY LOGIC ---
     if cmd_code == 2:
-        if not processing_future:
+        job = _find_job(data)
+        if not job or not job.future:
             return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "-1", "success": False}}), 200
 
-        if not processing_future.done():
-            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "0", "success": False}}), 200
+        # Long-poll: with data.wait (seconds), block until the job is finished (verdict, retry verdict
+        # or failure) instead of answering "0"; job state changes wake the wait early
+        wait_s = min(float((data.get("data") or {}).get("wait") or 0), CONFIG.LONG_POLL_MAX_S)
+        if wait_s > 0:
+            job.wait(wait_s)
 
-        main_result = processing_future.result()
+        if not job.future.done():
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "0", "success": False, "jobId": job.id}}), 200
+
+        main_result = job.future.result()["response"]
         result_data = main_result.get("data", {})
         
         if result_data.get("success", False):
-            return jsonify({
+            payload = {
                 "header": {"cmdCode": cmd_code},
                 "data": {
                     "success": True, 
@@ -48,67 +140,155 @@ def printcheck():
                     "nic_positions": result_data.get("nic_positions"), 
                     "nic_qr": result_data.get("nic_qr"),
                     "meter_qr": result_data.get("meter_qr"),
-                    "meter_ocr": result_data.get("meter_ocr")
+                    "meter_ocr": result_data.get("meter_ocr"),
+                    "jobId": job.id
                 }
-            }), 200
+            }
+            # Stations beyond the two-camera preset also report per-camera results
+            if "cameras" in result_data:
+                payload["data"]["cameras"] = result_data["cameras"]
+            return jsonify(payload), 200
 
-        # Automatic Retry Flow
-        if not retry_attempted:
-            retry_attempted = True
-            reset_usb_hub()
-            time.sleep(2)
+        # Automatic Retry Flow, once per job. It normally starts server-side when the first
+        # result fails; a poll only starts it if that has not happened yet
+        _start_retry(job)
 
-            # Re-resolve ports and capture
-            meter_port, nic_port = resolve_camera_ports()
-            meter_img, nic_img = capture_both_cameras(meter_port, nic_port)
+        if job.state == FAILED:
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "1", "success": False, "reason": job.error, "jobId": job.id}}), 200
 
-            if is_invalid_image(meter_img) or is_invalid_image(nic_img):
-                reset_v4l2_driver()
-                meter_port, nic_port = resolve_camera_ports()
-                
-                if CONFIG.get("YUY_MODE"):
-                    configure_camera(meter_port, 500)
-                    configure_camera(nic_port, 500)
+        # Settled without a retry (the next part was already presented): the first verdict stands
+        if job.state == DONE and job.retry_future is None:
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": dict(result_data, jobId=job.id)}), 200
 
-                meter_img, nic_img = capture_both_cameras(meter_port, nic_port)
+        if not job.retry_future or not job.retry_future.done():
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "0", "message": "Retrying", "success": False, "jobId": job.id}}), 200
 
-                if is_invalid_image(meter_img) or is_invalid_image(nic_img):
-                    return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "1", "success": False, "reason": "Hardware Failure"}}), 200
+        retry_result = job.retry_future.result()["response"]
+        return jsonify({"header": {"cmdCode": cmd_code}, "data": dict(retry_result.get("data", {}), jobId=job.id)}), 200
 
-            # Offload to worker thread (process_images function from processor module)
-            from processor import process_images
-            retry_future = executor.submit(process_images, meter_img, nic_img, data)
-            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "0", "message": "Retrying", "success": False}}), 200
+    # --- CMD 3: INITIALIZE CAPTURE ---
+    elif cmd_code == 3:
+        if not get_pool().is_ready() and not CONFIG.ACCEPT_BEFORE_READY:
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": False, "success": False, "reason": "Models not ready"}}), 200
 
-        if retry_future and not retry_future.done():
-            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"status": "0", "success": False}}), 200
+        job = JOBS.create(data)
+        if job is None:
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": False, "success": False, "reason": "Too many jobs in flight"}}), 200
 
-        retry_result = retry_future.result()
-        return jsonify({"header": {"cmdCode": cmd_code}, "data": retry_result.get("data", {})}), 200
+        # Hardware recovery only escalates when the health tracker or a bad capture calls for it
+        with capture_lock:
+            job.mark("capture_start")
+            frames = capture_with_recovery(min_level=LEVEL_NONE)
+            job.mark("captured")
+        if frames is None:
+            job.fail("Hardware Failure")
+            return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": False, "success": False, "jobId": job.id}}), 200
 
-    # --- CMD 3: INITIALIZE CAPTURE ---
-    elif cmd_code == 3:
-        retry_attempted = False
-        reset_usb_hub()
-        time.sleep(2)
-        
-        meter_port, nic_port = resolve_camera_ports()
-        meter_img, nic_img = capture_both_cameras(meter_port, nic_port)
-
-        if is_invalid_image(meter_img) or is_invalid_image(nic_img):
-            reset_v4l2_driver()
-            meter_port, nic_port = resolve_camera_ports()
-            if CONFIG.get("YUY_MODE"):
-                configure_camera(meter_port, 500)
-                configure_camera(nic_port, 500)
-            meter_img, nic_img = capture_both_cameras(meter_port, nic_port)
-
-            if is_invalid_image(meter_img) or is_invalid_image(nic_img):
-                return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": False, "success": False}}), 200
-
-        from processor import process_images
-        processing_future = executor.submit(process_images, meter_img, nic_img, data)
-        return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": True, "success": True}})
+        job.emit("captured")
+        from processor import run_pipeline
+        future = executor.submit(run_pipeline, frames, data, on_event=job.emit)
+        job.attach(future)
+        _archive_when_done(job, future, frames)
+        _retry_when_failed(job, future)
+        return jsonify({"header": {"cmdCode": cmd_code}, "data": {"captured": True, "success": True, "jobId": job.id}})
+
+@app.route('/printcheck/events', methods=['GET'])
+def printcheck_events():
+    """
+    Server-Sent Events stream of a job's stage events (captured, stage, verdict).
+    Verdict events carry the processor._build_response data. ?jobId= selects the
+    job (latest by default), ?since= resumes after the given number of events.
+    """
+    job_id = request.args.get("jobId")
+    job = JOBS.get(job_id) if job_id else JOBS.latest()
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    index = request.args.get("since", 0, type=int)
+    keepalive_s = CONFIG.SSE_KEEPALIVE_S
+
+    def stream():
+        nonlocal index
+        yield f"event: job\ndata: {json.dumps({'jobId': job.id})}\n\n"
+        while True:
+            events = job.events_since(index, keepalive_s)
+            for entry in events:
+                yield f"id: {index}\nevent: {entry['event']}\ndata: {json.dumps(entry)}\n\n"
+                index += 1
+            if not events:
+                if not job.is_active():
+                    return
+                yield ": keepalive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route('/jobs', methods=['GET'])
+def jobs():
+    """State and timings of every tracked job."""
+    return jsonify(JOBS.summaries()), 200
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness probe: answers as soon as the API process is up, before any model is loaded."""
+    return jsonify({"status": "ok", "uptime_s": round(time.monotonic() - STARTED, 1)}), 200
+
+@app.route('/status', methods=['GET'])
+def status():
+    """Model preload progress per worker, with load time per model."""
+    return jsonify(dict(get_pool().progress(), uptime_s=round(time.monotonic() - STARTED, 1))), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: true once every inference worker has its models loaded."""
+    pool = get_pool()
+    return jsonify({"ready": pool.is_ready(), "generation": pool.generation, "error": pool.last_error}), 200
+
+@app.route('/archive', methods=['GET'])
+def archive_stats():
+    """Audit archive queue depth and written, dropped and evicted record counts."""
+    if ARCHIVE is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(ARCHIVE.stats(), enabled=True)), 200
+
+@app.route('/cpu', methods=['GET'])
+def cpu():
+    """
+    Diagnostics: the CPU plan and actual CPU usage of the API process and each
+    inference worker, sampled over ?interval= seconds (default 1).
+    """
+    interval = min(request.args.get("interval", 1.0, type=float), 10.0)
+    processes = {"api": os.getpid()}
+    processes.update({f"worker-{pid}": pid for pid in get_pool().worker_pids()})
+    return jsonify({"plan": PLAN.describe(), "usage": cpu_usage(processes, interval)}), 200
+
+@app.route('/config', methods=['GET'])
+def config():
+    """Loaded settings version, last reload error and the version of each limits file."""
+    return jsonify(CONFIG.status()), 200
+
+@app.route('/config/reload', methods=['POST'])
+def config_reload():
+    """Reloads the settings file now; an invalid file is rejected and the running version kept."""
+    reloaded = CONFIG.reload()
+    return jsonify(dict(CONFIG.status(), reloaded=reloaded)), 200 if reloaded else 400
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Span histograms and retry/reset/failure counters in Prometheus text format."""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4"), 200
+
+@app.route('/station', methods=['GET'])
+def station():
+    """Cameras of this station with their physical ID, rotation, format, USB bus and checks."""
+    return jsonify(STATION.describe()), 200
+
+@app.route('/camera_health', methods=['GET'])
+def camera_health():
+    """
+    Recent capture outcomes per camera, how often each recovery level was needed
+    and the latest adaptive warm-up report per device.
+    """
+    return jsonify(dict(HEALTH.snapshot(), warmup=dict(LAST_REPORTS))), 200
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001)
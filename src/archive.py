@@ -0,0 +1,236 @@
+"""
+Asynchronous audit archive of captured frames and verdicts.
+The request path only puts a record on a bounded queue; a background writer
+encodes the frames, stores them under ARCHIVE_DIR/<YYYYMMDD>/ and indexes them in
+SQLite (ARCHIVE_DIR/index.sqlite). Under backpressure frames are stored at a
+reduced scale, and when the queue is full the record is dropped rather than
+stalling capture. The archive is kept under a disk quota by deleting the
+oldest parts first. replay.py can read the index directly (--archive); the
+index records each frame's scale so reduced and degraded frames replay with
+full-resolution windows.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+from config_loader import CONFIG
+from metrics import METRICS
+from frame_store import frame_scale
+
+ARCHIVED = METRICS.counter("hawk_archive_records_total", "Audit archive records by outcome")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    job_id TEXT,
+    retry INTEGER NOT NULL DEFAULT 0,
+    success INTEGER,
+    reason TEXT,
+    artwork TEXT,
+    meter TEXT,
+    nic TEXT,
+    frames TEXT,
+    scales TEXT,
+    degraded INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+def _encode(frame, fmt, quality):
+    """Returns the encoded bytes of a frame and the file extension used."""
+    if fmt == "npy":
+        return None, ".npy"
+    ext = "." + fmt
+    params = []
+    if fmt in ("jpg", "jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    elif fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    ok, buf = cv2.imencode(ext, frame, params)
+    if not ok:
+        raise RuntimeError(f"Could not encode frame as {fmt}")
+    return buf, ext
+
+
+class AuditArchive:
+    def __init__(self, root, fmt="jpg", quality=90, quota_mb=20000, queue_size=4, degraded_scale=0.5):
+        self.root = root
+        self.fmt = fmt.lower()
+        self.quality = quality
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.degraded_scale = degraded_scale
+        self.queue_size = queue_size
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="audit-archive", daemon=True)
+            self._thread.start()
+
+    def submit(self, frames, verdict, job_id=None, retry=False, artwork=None):
+        """
+        Queues frames ({camera: frame}) with their verdict data for archiving.
+        Never blocks; returns False when the record was dropped because the queue is full.
+        """
+        self.start()
+        record = {
+            "ts": time.time(),
+            "job_id": job_id,
+            "retry": retry,
+            "success": verdict.get("success"),
+            "reason": verdict.get("reason"),
+            "artwork": artwork,
+            "frames": {camera: frame for camera, frame in frames.items() if frame is not None},
+        }
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            ARCHIVED.inc(outcome="dropped")
+            return False
+
+    def flush(self, timeout=None):
+        """Waits until every queued record has been written (for tools and shutdown)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped,
+                "evicted": self.evicted, "error": self.last_error}
+
+    def _run(self):
+        db = sqlite3.connect(os.path.join(self.root, "index.sqlite"))
+        db.execute(SCHEMA)
+        # Indexes created before N-camera stations lack the frames column, older ones the scales column
+        columns = [row[1] for row in db.execute("PRAGMA table_info(parts)")]
+        for column in ("frames", "scales"):
+            if column not in columns:
+                db.execute(f"ALTER TABLE parts ADD COLUMN {column} TEXT")
+        db.commit()
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM parts").fetchone()[0]
+
+        while True:
+            record = self._queue.get()
+            try:
+                # Falling behind: store smaller frames so the writer catches up instead of dropping parts
+                degraded = self._queue.qsize() >= max(self.queue_size // 2, 1)
+                total += self._write(db, record, degraded)
+                total = self._enforce_quota(db, total)
+                self.written += 1
+                ARCHIVED.inc(outcome="degraded" if degraded else "written")
+            except Exception as e:
+                self.last_error = str(e)
+                ARCHIVED.inc(outcome="error")
+                print(f"Audit Archive Error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, db, record, degraded):
+        stamp = datetime.fromtimestamp(record["ts"])
+        directory = os.path.join(self.root, stamp.strftime("%Y%m%d"))
+        os.makedirs(directory, exist_ok=True)
+        base = f"{stamp.strftime('%H%M%S_%f')}_{record['job_id'] or 'part'}{'_retry' if record['retry'] else ''}"
+
+        paths, scales, size = {}, {}, 0
+        for camera, frame in record["frames"].items():
+            scales[camera] = frame_scale(frame)
+            if degraded and self.degraded_scale < 1.0:
+                scales[camera] /= self.degraded_scale
+                frame = cv2.resize(frame, None, fx=self.degraded_scale, fy=self.degraded_scale, interpolation=cv2.INTER_AREA)
+            buf, ext = _encode(frame, self.fmt, self.quality)
+            path = os.path.join(directory, f"{base}_{camera}{ext}")
+            if buf is None:
+                np.save(path, frame)
+            else:
+                buf.tofile(path)
+            size += os.path.getsize(path)
+            paths[camera] = os.path.relpath(path, self.root)
+
+        success = record["success"]
+        db.execute(
+            "INSERT INTO parts (ts, job_id, retry, success, reason, artwork, meter, nic, frames, scales, degraded, bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record["ts"], record["job_id"], int(record["retry"]), None if success is None else int(success),
+             record["reason"], record["artwork"], paths.get("meter"), paths.get("nic"), json.dumps(paths), json.dumps(scales), int(degraded), size)
+        )
+        db.commit()
+        return size
+
+    def _enforce_quota(self, db, total):
+        """Deletes the oldest parts until the archive fits its quota."""
+        while self.quota_bytes and total > self.quota_bytes:
+            row = db.execute("SELECT id, meter, nic, frames, bytes FROM parts ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return 0
+            part_id, meter, nic, frames, size = row
+            for rel in set(json.loads(frames).values() if frames else (meter, nic)):
+                if rel:
+                    try:
+                        os.remove(os.path.join(self.root, rel))
+                    except OSError:
+                        pass
+            db.execute("DELETE FROM parts WHERE id = ?", (part_id,))
+            db.commit()
+            total -= size
+            self.evicted += 1
+        return total
+
+
+def read_index(root, failed_only=False, since=None):
+    """
+    Yields archived parts as dicts with absolute frame paths, oldest first;
+    "frames" maps every archived camera to its path and "scales" to the factor
+    from the stored frame's pixels to full-resolution ones.
+    """
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+    db.row_factory = sqlite3.Row
+    query = "SELECT * FROM parts WHERE ts >= ?"
+    if failed_only:
+        query += " AND success = 0"
+    try:
+        for row in db.execute(query + " ORDER BY id", (since or 0,)):
+            part = dict(row)
+            frames = json.loads(part["frames"]) if part.get("frames") else {c: part[c] for c in ("meter", "nic") if part[c]}
+            part["frames"] = {camera: os.path.join(root, rel) for camera, rel in frames.items()}
+            # Records from before the scales column: full resolution, or the configured degraded scale
+            scales = json.loads(part["scales"]) if part.get("scales") else {}
+            fallback = 1 / CONFIG.ARCHIVE_DEGRADED_SCALE if part["degraded"] and CONFIG.ARCHIVE_DEGRADED_SCALE < 1.0 else 1
+            part["scales"] = {camera: scales.get(camera, fallback) for camera in frames}
+            for camera in ("meter", "nic"):
+                if part[camera]:
+                    part[camera] = os.path.join(root, part[camera])
+            yield part
+    finally:
+        db.close()
+
+
+# Singleton archive owned by the API process; None when archiving is disabled
+ARCHIVE = AuditArchive(
+    root=os.path.expanduser(CONFIG.ARCHIVE_DIR),
+    fmt=CONFIG.ARCHIVE_FORMAT,
+    quality=CONFIG.ARCHIVE_QUALITY,
+    quota_mb=CONFIG.ARCHIVE_QUOTA_MB,
+    queue_size=CONFIG.ARCHIVE_QUEUE_SIZE,
+    degraded_scale=CONFIG.ARCHIVE_DEGRADED_SCALE
+) if CONFIG.ARCHIVE_ENABLED else None
@@ -0,0 +1,88 @@
+"""
+Artwork template cache keyed by idealArtworkPath.
+Holds the data the vision stages take from an artwork's sidecar
+(<artwork>.json): the per-stage ROI regions and the logo position windows.
+The template image itself is not decoded; it only has to exist.
+Entries are evicted least-recently-used and reloaded when the sidecar's
+mtime changes. Specs are small dicts, so workers receive them pickled.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from config_loader import CONFIG
+
+
+class ArtworkMissing(FileNotFoundError):
+    """The idealArtworkPath of a part does not exist."""
+
+    def __init__(self, path):
+        super().__init__(f"Artwork Missing: {path}")
+        self.path = path
+
+
+def _sidecar_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+def _sidecar_mtime(path):
+    try:
+        return os.stat(_sidecar_path(path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ArtworkCache:
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, path):
+        """Spec for an artwork path (None without a path); raises ArtworkMissing when the file is gone."""
+        if not path:
+            return None
+        if not os.path.exists(path):
+            raise ArtworkMissing(path)
+        stamp = _sidecar_mtime(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["stamp"] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry["spec"]
+
+        entry = {"spec": self._build(path), "stamp": stamp}
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = entry
+            self.loads += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry["spec"]
+
+    def _build(self, path):
+        """Precomputes what the vision stages use from one artwork's sidecar."""
+        try:
+            with open(_sidecar_path(path), "r") as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            sidecar = {}
+
+        return {
+            "path": path,
+            "regions": sidecar.get("regions", {}),
+            "position_windows": sidecar.get("positions", {}),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton cache owned by the API process
+ARTWORK = ArtworkCache(max_entries=CONFIG.ARTWORK_CACHE_SIZE)
@@ -0,0 +1,127 @@
+"""
+Micro-batching in front of the inference pool.
+Calls to a vision function with a .batched variant (one model pass over
+several inputs, e.g. the layout checks of overlapping parts) that arrive
+within BATCH_WINDOW_MS of each other are sent to one worker as a single job,
+up to BATCH_MAX_SIZE calls. Functions without one go straight to the pool, so
+their calls keep running in parallel on separate workers.
+"""
+
+import time
+import threading
+import concurrent.futures
+from config_loader import CONFIG
+from worker_pool import get_pool
+from metrics import METRICS, observe
+
+BATCH_SIZES = METRICS.histogram("hawk_batch_size", "Calls per dispatched inference job", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+
+
+def _run_batch(fn, calls):
+    """
+    Runs in a worker. Returns one (ok, value) pair per call; when the batched variant
+    fails, the calls are retried one by one so a bad input only fails its own call.
+    """
+    batched = getattr(fn, "batched", None)
+    if batched is not None and len(calls) > 1:
+        try:
+            return [(True, result) for result in batched(calls)]
+        except Exception:
+            pass
+    results = []
+    for args, kwargs in calls:
+        try:
+            results.append((True, fn(*args, **kwargs)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+class MicroBatcher:
+    def __init__(self, pool, window_ms=5, max_batch=4):
+        self.pool = pool
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+
+        self._cond = threading.Condition()
+        # fn -> {"deadline", "calls": [(args, kwargs, future, queued_at)]}
+        self._pending = {}
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Same contract as InferencePool.submit; a batchable call may wait up to one window for company."""
+        if getattr(fn, "batched", None) is None:
+            return self.pool.submit(fn, *args, **kwargs)
+        future = concurrent.futures.Future()
+        with self._cond:
+            batch = self._pending.get(fn)
+            if batch is None:
+                batch = self._pending[fn] = {"deadline": time.monotonic() + self.window_s, "calls": []}
+            batch["calls"].append((args, kwargs, future, time.monotonic()))
+            if len(batch["calls"]) >= self.max_batch:
+                batch["deadline"] = 0
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [fn for fn, batch in self._pending.items() if batch["deadline"] <= now]
+                if not due:
+                    self._cond.wait(min(batch["deadline"] for batch in self._pending.values()) - now)
+                    continue
+                batches = [(fn, self._pending.pop(fn)["calls"]) for fn in due]
+            for fn, calls in batches:
+                self._dispatch(fn, calls)
+
+    def _dispatch(self, fn, calls):
+        # Calls cancelled while queued (fail-fast verdicts) are dropped here
+        calls = [call for call in calls if call[2].set_running_or_notify_cancel()]
+        if not calls:
+            return
+        now = time.monotonic()
+        for _, _, _, queued_at in calls:
+            observe("batch_wait", now - queued_at, task=fn.__name__)
+        BATCH_SIZES.observe(len(calls), task=fn.__name__)
+
+        try:
+            job = self.pool.submit(_run_batch, fn, [(args, kwargs) for args, kwargs, _, _ in calls])
+        except Exception as e:
+            for _, _, future, _ in calls:
+                future.set_exception(e)
+            return
+        job.add_done_callback(lambda f: self._resolve(f, calls))
+
+    def _resolve(self, job, calls):
+        if job.cancelled() or job.exception() is not None:
+            error = job.exception() if not job.cancelled() else concurrent.futures.CancelledError()
+            for _, _, future, _ in calls:
+                future.set_exception(error)
+            return
+        for (_, _, future, _), (ok, value) in zip(calls, job.result()):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+_batcher = None
+_batcher_built = False
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """
+    The process-wide micro-batcher, or None when BATCH_WINDOW_MS is 0 (batching off).
+    Window and size are read once, on first use; changing them takes a restart.
+    """
+    global _batcher, _batcher_built
+    with _batcher_lock:
+        if not _batcher_built:
+            if CONFIG.BATCH_WINDOW_MS:
+                _batcher = MicroBatcher(get_pool(), CONFIG.BATCH_WINDOW_MS, CONFIG.BATCH_MAX_SIZE)
+            _batcher_built = True
+        return _batcher
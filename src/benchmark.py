@@ -0,0 +1,359 @@
+"""
+Reproducible cycle-time benchmark.
+Replaces the V4L2 cameras with a fake source (synthetic or recorded frames,
+configurable latency and failure injection) and the vision models with
+deterministic stand-ins of configurable compute cost, then measures:
+
+    capture       capture_cameras per trigger and validation per frame
+    pipeline      every vision stage (collect-all) and the whole run_pipeline
+    end_to_end    cmd 3 -> first verdict and cmd 3 -> final verdict through the API,
+                  with throughput under concurrent clients
+
+Exits non-zero when any run ends in an Inference Engine Error, since its
+timings would not measure the pipeline.
+
+Usage (from src/):
+    python benchmark.py --iterations 50 --clients 2 --out bench.json
+    python benchmark.py --compare bench_old.json --out bench_new.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+# --config names the settings file; it has to be set before config_loader loads it at import
+if __name__ == "__main__" and "--config" in sys.argv[:-1]:
+    os.environ["HAWK_CONFIG"] = sys.argv[sys.argv.index("--config") + 1]
+
+from config_loader import CONFIG
+from station import STATION
+
+
+# --- Deterministic model stand-ins (run inside the worker processes) ---
+
+class StubModel:
+    def __init__(self, cost_ms, mode="spin"):
+        self.cost_ms = cost_ms
+        self.mode = mode
+        self.limits = {}
+
+    def _work(self):
+        """Burns cost_ms of CPU (spin) or wall time (sleep)."""
+        if self.mode == "sleep":
+            time.sleep(self.cost_ms / 1000.0)
+            return
+        deadline = time.perf_counter() + self.cost_ms / 1000.0
+        while time.perf_counter() < deadline:
+            pass
+
+class StubYOLO(StubModel):
+    def detect_and_process(self, image):
+        self._work()
+        return [
+            {"label": "logo_ce", "bbox": [110, 210, 140, 240], "conf": 0.92},
+            {"label": "brand_label", "bbox": [510, 55, 590, 95], "conf": 0.95}
+        ]
+
+class StubOCR(StubModel):
+    def perform_inference(self, image):
+        self._work()
+        return [{"text": "METER-ID-2026", "xmin": 100.0, "y_center": 65.0, "poly": [[100, 50], [200, 50], [200, 80], [100, 80]]}]
+
+class StubQR(StubModel):
+    def decode_tiered(self, image, exact=False):
+        self._work()
+        return {"text": "AIK123456", "bbox": [1200, 800, 1450, 1050], "tier": "stub"}
+
+def _init_stub_worker(costs, mode):
+    """Pool initializer installing the stand-ins as the per-process models."""
+    import vision_logo
+    import vision_ocr
+    import vision_qr
+
+    vision_logo._detector = StubYOLO(costs["yolo"], mode)
+    vision_ocr._ocr_engine = StubOCR(costs["ocr"], mode)
+    vision_qr._validator = StubQR(costs["qr"], mode)
+
+
+# --- Fake camera source ---
+
+class FakeCameras:
+    """Stands in for hardware.capture_cam with synthetic or recorded frames."""
+
+    def __init__(self, width, height, latency_ms=50, jitter_ms=10, failure_rate=0.0, invalid_rate=0.0, frames_dir=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.invalid_rate = invalid_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+
+        if frames_dir:
+            paths = sorted(os.path.join(frames_dir, f) for f in os.listdir(frames_dir))
+            self.frames = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+            if not self.frames:
+                raise RuntimeError(f"No readable frames in {frames_dir}")
+        else:
+            gen = np.random.default_rng(seed)
+            # Coarse texture upscaled: cheap to build, not flagged as black, saturated or blurry
+            coarse = gen.integers(40, 200, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8)
+            self.frames = [cv2.resize(coarse, (width, height), interpolation=cv2.INTER_NEAREST)]
+        self.black = np.zeros_like(self.frames[0])
+
+    def capture_cam(self, cam_args):
+        with self._lock:
+            self._count += 1
+            count = self._count
+            delay = max(self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms), 0)
+            roll = self._rng.random()
+
+        time.sleep(delay / 1000.0)
+        if roll < self.failure_rate:
+            raise RuntimeError(f"Injected capture failure on {cam_args['device']}")
+        if roll < self.failure_rate + self.invalid_rate:
+            return self.black.copy()
+        # Vary every capture slightly so the frozen-frame check does not trip
+        return cv2.add(self.frames[count % len(self.frames)], count % 5 + 1)
+
+
+# --- Measurement ---
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, ms):
+        with self._lock:
+            self.samples.setdefault(name, []).append(ms)
+
+    def timed(self, name, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+
+    def report(self):
+        return {name: summarize(values) for name, values in sorted(self.samples.items())}
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(np.ceil(q / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[rank]
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(float(np.mean(ordered)), 2) if ordered else None,
+        "p50_ms": round(percentile(ordered, 50), 2) if ordered else None,
+        "p95_ms": round(percentile(ordered, 95), 2) if ordered else None,
+        "p99_ms": round(percentile(ordered, 99), 2) if ordered else None,
+    }
+
+
+# --- Phases ---
+
+def install_fakes(cameras, recorder, reset_ms):
+    """Patches the hardware layer so capture and recovery run against the fake cameras."""
+    import hardware
+    import camera_health
+
+    CONFIG.override(CAMERA_STREAMING=0, USB_RESET_SETTLE_S=0)
+    hardware.capture_cam = cameras.capture_cam
+    camera_health.resolve_ports = lambda cameras=None: {c: f"fake:{c}" for c in (cameras or camera_health.CAMERAS)}
+    camera_health.reset_usb_hub = lambda ports=None: time.sleep(reset_ms / 1000.0)
+    camera_health.reset_v4l2_driver = lambda: time.sleep(reset_ms / 1000.0)
+    camera_health.configure_camera = lambda device, exposure_val=500: None
+    camera_health.capture_cameras = recorder.timed("capture", camera_health.capture_cameras)
+    camera_health.VALIDATOR.validate = recorder.timed("validation", camera_health.VALIDATOR.validate)
+
+def run_capture_phase(recorder, iterations):
+    from camera_health import capture_with_recovery
+    timed = recorder.timed("capture_with_recovery", capture_with_recovery)
+    failures = 0
+    for _ in range(iterations):
+        if timed() is None:
+            failures += 1
+    return {"hardware_failures": failures}
+
+def run_pipeline_phase(recorder, iterations, cameras):
+    from processor import run_pipeline
+    data = {"header": {"cmdCode": 3}, "data": {"idealArtworkPath": None}}
+    engine_errors = 0
+    for _ in range(iterations):
+        frames = {camera: cameras.capture_cam({"device": f"fake:{camera}"}) for camera in STATION.names()}
+        start = time.perf_counter()
+        result = run_pipeline(frames, data, collect_all=True)
+        recorder.add("pipeline", (time.perf_counter() - start) * 1000)
+        for task, seconds in result["timings"].items():
+            recorder.add(f"stage.{task}", seconds * 1000)
+        if result["error"]:
+            engine_errors += 1
+    return {"engine_errors": engine_errors}
+
+def _engine_error(verdict):
+    return str(verdict.get("reason") or "").startswith("Inference Engine Error")
+
+def run_end_to_end_phase(recorder, iterations, clients):
+    """Drives cmd 3 / long-poll cmd 2 through the Flask app from concurrent clients."""
+    from app import app
+    counts = {"verdicts": 0, "rejected": 0, "hardware_failures": 0, "engine_errors": 0}
+    lock = threading.Lock()
+
+    def client(n):
+        http = app.test_client()
+        for _ in range(n):
+            start = time.perf_counter()
+            while True:
+                resp = http.post("/printcheck", json={"header": {"cmdCode": 3}, "data": {"idealArtworkPath": None}}).get_json()
+                if resp["data"].get("reason") != "Too many jobs in flight":
+                    break
+                with lock:
+                    counts["rejected"] += 1
+                time.sleep(0.01)
+            if not resp["data"].get("captured"):
+                with lock:
+                    counts["hardware_failures"] += 1
+                continue
+
+            job_id = resp["data"]["jobId"]
+            first = None
+            while True:
+                poll = http.post("/printcheck", json={"header": {"cmdCode": 2}, "data": {"jobId": job_id, "wait": 30}}).get_json()["data"]
+                if first is None and (poll.get("status") == "1" or poll.get("message") == "Retrying"):
+                    first = (time.perf_counter() - start) * 1000
+                    recorder.add("e2e_first_verdict", first)
+                if poll.get("status") != "0":
+                    break
+            recorder.add("e2e_final_verdict", (time.perf_counter() - start) * 1000)
+            with lock:
+                counts["verdicts"] += 1
+                counts["engine_errors"] += _engine_error(poll)
+
+    per_client = [iterations // clients + (1 if i < iterations % clients else 0) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(n,)) for n in per_client]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    counts["seconds"] = round(elapsed, 3)
+    counts["verdicts_per_s"] = round(counts["verdicts"] / elapsed, 3) if elapsed > 0 else 0.0
+    return counts
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], universal_newlines=True,
+                                       stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+def compare(baseline, current):
+    """Relative change of p50/p95/p99 per metric, current vs baseline."""
+    deltas = {}
+    for name, stats in current["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if not base:
+            continue
+        deltas[name] = {
+            key: round((stats[key] - base[key]) / base[key] * 100, 1)
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+            if stats.get(key) is not None and base.get(key)
+        }
+    return deltas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark capture, validation, vision stages and end-to-end latency.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--clients", type=int, default=2, help="Concurrent API clients in the end-to-end phase")
+    parser.add_argument("--workers", type=int, help="Inference worker processes (default: INFERENCE_WORKERS)")
+    parser.add_argument("--width", type=int, default=CONFIG.WIDTH)
+    parser.add_argument("--height", type=int, default=CONFIG.HEIGHT)
+    parser.add_argument("--config", help="Settings file (default: HAWK_CONFIG or ~/.config/Hawk/hawk_settings.conf)")
+    parser.add_argument("--frames-dir", help="Serve recorded frames from this directory instead of synthetic ones")
+    parser.add_argument("--camera-latency-ms", type=float, default=50)
+    parser.add_argument("--camera-jitter-ms", type=float, default=10)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of captures that raise")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Fraction of captures that return black frames")
+    parser.add_argument("--reset-ms", type=float, default=500, help="Simulated hub/driver reset time")
+    parser.add_argument("--yolo-ms", type=float, default=120)
+    parser.add_argument("--ocr-ms", type=float, default=250)
+    parser.add_argument("--qr-ms", type=float, default=80)
+    parser.add_argument("--stub-mode", choices=("spin", "sleep"), default="spin")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--phases", default="capture,pipeline,end_to_end")
+    parser.add_argument("--compare", help="Earlier benchmark JSON to compare against")
+    parser.add_argument("--out", default="-", help="Output JSON file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    costs = {"yolo": args.yolo_ms, "ocr": args.ocr_ms, "qr": args.qr_ms}
+    from worker_pool import get_pool
+    overrides = {"initializer": _init_stub_worker, "initargs": (costs, args.stub_mode)}
+    if args.workers:
+        overrides["max_workers"] = args.workers
+    pool = get_pool(**overrides)
+    pool.start(wait=True)
+    if not pool.is_ready():
+        raise RuntimeError(f"Inference pool failed to start: {pool.last_error}")
+
+    recorder = Recorder()
+    cameras = FakeCameras(args.width, args.height, args.camera_latency_ms, args.camera_jitter_ms,
+                          args.failure_rate, args.invalid_rate, args.frames_dir, args.seed)
+    install_fakes(cameras, recorder, args.reset_ms)
+
+    phases = [p.strip() for p in args.phases.split(",") if p.strip()]
+    results = {}
+    try:
+        if "capture" in phases:
+            results["capture"] = run_capture_phase(recorder, args.iterations)
+        if "pipeline" in phases:
+            results["pipeline"] = run_pipeline_phase(recorder, args.iterations, cameras)
+        if "end_to_end" in phases:
+            results["end_to_end"] = run_end_to_end_phase(recorder, args.iterations, args.clients)
+    finally:
+        pool.shutdown()
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": vars(args),
+        "metrics": recorder.report(),
+        "phases": results,
+    }
+    if args.compare:
+        with open(args.compare, "r") as f:
+            report["change_pct_vs_baseline"] = compare(json.load(f), report)
+
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    # Timings of runs that crashed in the engine measure nothing; don't let them pass as a result
+    engine_errors = sum(phase.get("engine_errors", 0) for phase in results.values())
+    if engine_errors:
+        print(f"Benchmark invalid: {engine_errors} runs ended in an Inference Engine Error", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Camera health tracking and conditional hardware recovery.
+Recent capture outcomes are kept per camera, and the capture flow escalates
+through no reset, USB hub power cycle and uvcvideo driver reload only when the
+tracker or a failed capture calls for it.
+"""
+
+import time
+import threading
+from collections import deque
+from config_loader import CONFIG
+from hardware import (
+    reset_usb_hub,
+    reset_v4l2_driver,
+    capture_cameras,
+    resolve_ports,
+    configure_camera
+)
+from frame_validation import VALIDATOR
+from station import STATION
+from metrics import span, RESETS, FAILURES, INVALID_FRAMES
+
+# Recovery levels, in escalation order
+LEVEL_NONE = 0
+LEVEL_HUB_RESET = 1
+LEVEL_DRIVER_RELOAD = 2
+LEVEL_NAMES = ("none", "usb_hub_reset", "v4l2_driver_reload")
+
+
+class CameraHealth:
+    def __init__(self, window=20, hub_reset_after=1, driver_reload_after=3):
+        self.window = window
+        self.hub_reset_after = hub_reset_after
+        self.driver_reload_after = driver_reload_after
+
+        self._lock = threading.Lock()
+        self._events = {}
+        self._reasons = {}
+        self._escalations = {name: {"count": 0, "total_ms": 0.0, "last_ms": None} for name in LEVEL_NAMES}
+
+    def record(self, camera, outcome, reason=None):
+        """
+        Records a capture outcome for a camera: "ok", "failed" (no frame) or "invalid",
+        with the validator's reason code for invalid frames.
+        """
+        with self._lock:
+            events = self._events.setdefault(camera, deque(maxlen=self.window))
+            events.append(outcome)
+            if reason:
+                reasons = self._reasons.setdefault(camera, {})
+                reasons[reason] = reasons.get(reason, 0) + 1
+
+    def record_escalation(self, level, elapsed_ms):
+        with self._lock:
+            stats = self._escalations[LEVEL_NAMES[level]]
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["last_ms"] = round(elapsed_ms, 1)
+
+    def consecutive_failures(self, camera):
+        with self._lock:
+            count = 0
+            for outcome in reversed(self._events.get(camera, ())):
+                if outcome == "ok":
+                    break
+                count += 1
+            return count
+
+    def recommended_level(self):
+        """Recovery level to apply before the next capture, based on the worst camera."""
+        with self._lock:
+            cameras = list(self._events)
+        worst = max((self.consecutive_failures(c) for c in cameras), default=0)
+        if worst >= self.driver_reload_after:
+            return LEVEL_DRIVER_RELOAD
+        if worst >= self.hub_reset_after:
+            return LEVEL_HUB_RESET
+        return LEVEL_NONE
+
+    def snapshot(self):
+        with self._lock:
+            cameras = {
+                camera: {
+                    "ok": events.count("ok"),
+                    "failed": events.count("failed"),
+                    "invalid": events.count("invalid"),
+                    "last": events[-1] if events else None,
+                    "invalid_reasons": dict(self._reasons.get(camera, {}))
+                }
+                for camera, events in self._events.items()
+            }
+            escalations = {name: dict(stats, total_ms=round(stats["total_ms"], 1)) for name, stats in self._escalations.items()}
+        return {"cameras": cameras, "escalations": escalations, "recommended_level": LEVEL_NAMES[self.recommended_level()]}
+
+
+HEALTH = CameraHealth(
+    window=CONFIG.HEALTH_WINDOW,
+    hub_reset_after=CONFIG.HEALTH_HUB_RESET_AFTER,
+    driver_reload_after=CONFIG.HEALTH_DRIVER_RELOAD_AFTER
+)
+
+def _apply_settings(settings):
+    """Escalation thresholds follow config reloads; the history window keeps its size."""
+    HEALTH.hub_reset_after = settings.HEALTH_HUB_RESET_AFTER
+    HEALTH.driver_reload_after = settings.HEALTH_DRIVER_RELOAD_AFTER
+
+CONFIG.subscribe(_apply_settings)
+
+CAMERAS = STATION.names()
+
+def _hub_ports(cameras):
+    """Hub ports to cycle for a subset of cameras; None (all ports) unless every camera has its own."""
+    if set(cameras) == set(CAMERAS):
+        return None
+    ports = [STATION.camera(camera).hub_port for camera in cameras]
+    if any(p is None for p in ports):
+        return None
+    return ports
+
+def _apply_recovery(level, cameras):
+    """Runs one recovery step and records how long it took."""
+    start = time.monotonic()
+    if level == LEVEL_HUB_RESET:
+        reset_usb_hub(_hub_ports(cameras))
+        time.sleep(CONFIG.USB_RESET_SETTLE_S)
+    elif level == LEVEL_DRIVER_RELOAD:
+        reset_v4l2_driver()
+    HEALTH.record_escalation(level, (time.monotonic() - start) * 1000)
+    RESETS.inc(level=LEVEL_NAMES[level])
+
+def _outcome(camera, img):
+    """Returns (outcome, reason) for a captured frame."""
+    if img is None:
+        return "failed", None
+    with span("validation", camera=camera):
+        verdict = VALIDATOR.validate(img, key=camera)
+    if verdict["valid"]:
+        return "ok", None
+    INVALID_FRAMES.inc(camera=camera, reason=verdict["reason"])
+    return "invalid", verdict["reason"]
+
+def capture_with_recovery(min_level=LEVEL_NONE, cameras=CAMERAS):
+    """
+    Captures the given cameras, escalating the recovery level after each bad capture.
+    Starts at the level the health tracker recommends (at least min_level).
+    Returns {camera: frame}, or None if the highest level also failed.
+    """
+    level = max(min_level, HEALTH.recommended_level())
+    while True:
+        if level != LEVEL_NONE:
+            _apply_recovery(level, cameras)
+        else:
+            HEALTH.record_escalation(level, 0.0)
+
+        ports = resolve_ports(cameras)
+        if level == LEVEL_DRIVER_RELOAD:
+            for camera, port in ports.items():
+                if port is not None and STATION.camera(camera).format == "yuyv":
+                    configure_camera(port, 500)
+
+        frames = capture_cameras(ports)
+        all_ok = True
+        for camera, img in frames.items():
+            state, reason = _outcome(camera, img)
+            HEALTH.record(camera, state, reason)
+            all_ok = all_ok and state == "ok"
+
+        if all_ok:
+            return frames
+        if level >= LEVEL_DRIVER_RELOAD:
+            FAILURES.inc(reason="hardware")
+            return None
+        level += 1
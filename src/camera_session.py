@@ -0,0 +1,144 @@
+"""
+Persistent camera streaming sessions.
+A background thread keeps each device open and streaming into a small ring
+buffer of (monotonic timestamp, frame) pairs, so a trigger can take the freshest
+frame without re-opening the device or repeating the sensor warm-up.
+"""
+
+import time
+import threading
+import subprocess
+from collections import deque
+import cv2
+from config_loader import CONFIG
+from resources import get_plan
+
+
+class CameraSession:
+    def __init__(self, device, yuyv=False, buffer_size=2, reconnect_delay=1.0):
+        self.device = device
+        self.yuyv = yuyv
+        self.reconnect_delay = reconnect_delay
+
+        self._frames = deque(maxlen=max(buffer_size, 1))
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reconnects = 0
+        self.read_failures = 0
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"camera-session-{self.device}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            self._frames.clear()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self, newer_than=None, timeout=5.0):
+        """
+        Returns (timestamp, frame) for the freshest buffered frame. With newer_than,
+        waits for the first frame stamped after that monotonic time.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._frames:
+                    ts, frame = self._frames[-1]
+                    if newer_than is None or ts > newer_than:
+                        if newer_than is not None:
+                            # Earliest frame after the trigger, not just the newest one
+                            ts, frame = next((f for f in self._frames if f[0] > newer_than), (ts, frame))
+                        return ts, frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No frame from {self.device} within {timeout}s")
+                self._cond.wait(remaining)
+
+    def _open(self):
+        width, height = CONFIG.resolution
+        fourcc = "YUYV" if self.yuyv else "MJPG"
+
+        subprocess.run([
+            "v4l2-ctl", "-d", self.device,
+            f"--set-fmt-video=width={width},height={height},pixelformat={fourcc}"
+        ], capture_output=True)
+
+        cap = cv2.VideoCapture(self.device, cv2.CAP_V4L2)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open device {self.device}")
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*fourcc))
+        # Keep the driver queue short so buffered frames are not stale
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _run(self):
+        get_plan().pin("capture")
+        cap = None
+        while not self._stop.is_set():
+            if cap is None:
+                try:
+                    cap = self._open()
+                except Exception as e:
+                    self.last_error = str(e)
+                    self._stop.wait(self.reconnect_delay)
+                    continue
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                # Device dropped (USB reset, unplug): reopen after a short delay
+                self.read_failures += 1
+                self.reconnects += 1
+                self.last_error = f"Read failed on {self.device}"
+                cap.release()
+                cap = None
+                with self._cond:
+                    self._frames.clear()
+                self._stop.wait(self.reconnect_delay)
+                continue
+
+            with self._cond:
+                self._frames.append((time.monotonic(), frame))
+                self._cond.notify_all()
+
+        if cap is not None:
+            cap.release()
+
+
+# Sessions keyed by device node
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(device, yuyv=None):
+    """Returns the running session for a device, starting one if needed (YUYV per YUY_MODE unless given)."""
+    with _sessions_lock:
+        session = _sessions.get(device)
+        if session is None:
+            session = CameraSession(
+                device,
+                yuyv=CONFIG.YUY_MODE if yuyv is None else yuyv,
+                buffer_size=CONFIG.STREAM_BUFFER_SIZE,
+                reconnect_delay=CONFIG.STREAM_RECONNECT_DELAY
+            )
+            _sessions[device] = session
+        return session.start()
+
+def close_all_sessions():
+    """Stops every session, e.g. before a USB or driver reset re-enumerates the devices."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.stop()
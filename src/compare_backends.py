@@ -0,0 +1,209 @@
+"""
+Accuracy/latency comparison of inference backends on saved parts.
+Builds the vision models twice, once with the reference settings and once with
+the candidate overrides (e.g. an INT8 ONNX detector), runs every stage of each
+part through both in this process and reports verdict and per-stage agreement,
+detection/text differences and per-stage latency. With --archive the candidate
+is also checked against the verdict recorded on the line.
+
+Usage (from src/):
+    python compare_backends.py --archive ~/.local/share/Hawk/archive \\
+        --set YOLO_BACKEND=onnx --set YOLO_ONNX_MODEL=weights/prod_v1_int8.onnx --out compare.json
+    python compare_backends.py --meter-dir M --nic-dir N --set OCR_BACKEND=paddle_hpi
+
+Overrides apply while the models are built, i.e. to backend and model settings.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# --config names the settings file; it has to be set before config_loader loads it at import
+if __name__ == "__main__" and "--config" in sys.argv[:-1]:
+    os.environ["HAWK_CONFIG"] = sys.argv[sys.argv.index("--config") + 1]
+
+from config_loader import CONFIG
+from artwork_cache import ARTWORK
+from processor import STAGES, TASK_CAMERAS, TASK_CHECKS, task_call, _verdict
+from replay import parts_from_dirs, parts_from_manifest, parts_from_archive, load_frames
+from benchmark import summarize
+import vision_logo
+import vision_ocr
+import vision_qr
+
+def parse_overrides(items):
+    """KEY=VALUE strings to a dict, with numbers converted like the config loader does."""
+    overrides = {}
+    for item in items or []:
+        key, value = item.split("=", 1)
+        value = value.strip()
+        if value.replace(".", "", 1).isdigit():
+            value = float(value) if "." in value else int(value)
+        overrides[key.strip()] = value
+    return overrides
+
+def build_models(overrides):
+    """Builds detector, OCR engine and QR validator with CONFIG temporarily overridden."""
+    with CONFIG.overridden(**overrides):
+        return (
+            vision_logo.DetectionYOLO("weights/prod_v1.pt", "config/limits.json"),
+            vision_ocr.OCR("config/ocr_limits.json"),
+            vision_qr.QRValidator("config/qr_limits.json"),
+        )
+
+def _install(models):
+    vision_logo._detector, vision_ocr._ocr_engine, vision_qr._validator = models
+
+def run_part(models, frames, artwork):
+    """Runs every task of the station with one model set. Returns (results, outcomes, success, timings in ms)."""
+    _install(models)
+    results, timings = {}, {}
+    for task in TASK_CAMERAS:
+        fn, args, kwargs = task_call(task, frames, artwork)
+        start = time.perf_counter()
+        try:
+            results[task] = fn(*args, **kwargs)
+        except Exception as e:
+            results[task] = {"error": str(e)}
+        timings[task] = (time.perf_counter() - start) * 1000
+
+    outcomes = {}
+    for name, task, evaluate, _ in STAGES:
+        try:
+            passed, reason = evaluate(results[task])
+        except Exception as e:
+            passed, reason = False, str(e)
+        outcomes[name] = {"passed": passed, "reason": "" if passed else reason}
+    success = _verdict(3, outcomes, None)["data"]["success"]
+    return results, outcomes, success, timings
+
+def _iou(a, b):
+    ix = max(min(a[2], b[2]) - max(a[0], b[0]), 0)
+    iy = max(min(a[3], b[3]) - max(a[1], b[1]), 0)
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def detection_match(ref, cand):
+    """Matches candidate detections to reference ones by label; returns (matched, missing, extra, mean IoU)."""
+    ref, cand = list(ref or []), list(cand or [])
+    ious, used = [], set()
+    for r in ref:
+        best, best_j = 0.0, None
+        for j, c in enumerate(cand):
+            if j not in used and c["label"] == r["label"]:
+                iou = _iou(r["bbox"], c["bbox"])
+                if iou > best:
+                    best, best_j = iou, j
+        if best_j is not None:
+            used.add(best_j)
+            ious.append(best)
+    return len(ious), len(ref) - len(ious), len(cand) - len(ious), (sum(ious) / len(ious) if ious else None)
+
+def _texts(task, result):
+    if TASK_CHECKS[task] in ("qr", "qr_position"):
+        return result.get("codes") or []
+    if TASK_CHECKS[task] == "ocr":
+        return [d["text"] for d in result.get("data") or []]
+    return None
+
+def compare(parts, reference, candidate, max_mismatches=50):
+    ref_models, cand_models = build_models(reference), build_models(candidate)
+    latency = {"reference": {}, "candidate": {}}
+    stage_agree = {name: 0 for name, _, _, _ in STAGES}
+    counts = {"parts": 0, "unreadable": 0, "verdict_agree": 0, "recorded": 0, "candidate_matches_recorded": 0,
+              "text_mismatches": 0, "detections_missing": 0, "detections_extra": 0}
+    ious, mismatches = [], []
+
+    for part in parts:
+        frames = load_frames(part)
+        if any(frame is None for frame in frames.values()):
+            counts["unreadable"] += 1
+            continue
+        artwork = ARTWORK.get(part["artwork"]) if part.get("artwork") else None
+        ref_res, ref_out, ref_ok, ref_ms = run_part(ref_models, frames, artwork)
+        cand_res, cand_out, cand_ok, cand_ms = run_part(cand_models, frames, artwork)
+
+        counts["parts"] += 1
+        counts["verdict_agree"] += int(ref_ok == cand_ok)
+        if part.get("recorded_success") is not None:
+            counts["recorded"] += 1
+            counts["candidate_matches_recorded"] += int(bool(part["recorded_success"]) == cand_ok)
+        for label, timings in (("reference", ref_ms), ("candidate", cand_ms)):
+            for task, ms in timings.items():
+                latency[label].setdefault(task, []).append(ms)
+
+        diffs = []
+        for name, _, _, _ in STAGES:
+            if ref_out[name]["passed"] == cand_out[name]["passed"]:
+                stage_agree[name] += 1
+            else:
+                diffs.append({"stage": name, "reference": ref_out[name], "candidate": cand_out[name]})
+        for task in TASK_CAMERAS:
+            if TASK_CHECKS[task] == "layout":
+                _, missing, extra, iou = detection_match(ref_res[task].get("detections"), cand_res[task].get("detections"))
+                counts["detections_missing"] += missing
+                counts["detections_extra"] += extra
+                if iou is not None:
+                    ious.append(iou)
+                continue
+            ref_text, cand_text = _texts(task, ref_res[task]), _texts(task, cand_res[task])
+            if ref_text != cand_text:
+                counts["text_mismatches"] += 1
+                diffs.append({"task": task, "reference": ref_text, "candidate": cand_text})
+
+        if diffs and len(mismatches) < max_mismatches:
+            mismatches.append({"part_id": part["part_id"], "differences": diffs})
+
+    parts_n = max(counts["parts"], 1)
+    report = {
+        "reference": reference,
+        "candidate": candidate,
+        "counts": counts,
+        "verdict_agreement": round(counts["verdict_agree"] / parts_n, 4),
+        "stage_agreement": {name: round(n / parts_n, 4) for name, n in stage_agree.items()},
+        "mean_detection_iou": round(sum(ious) / len(ious), 4) if ious else None,
+        "latency": {label: {task: summarize(v) for task, v in tasks.items()} for label, tasks in latency.items()},
+        "mismatches": mismatches,
+    }
+    if counts["recorded"]:
+        report["candidate_vs_recorded"] = round(counts["candidate_matches_recorded"] / counts["recorded"], 4)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a candidate inference backend against the reference on saved parts.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--meter-dir", help="Directory of meter images (paired with --nic-dir by file stem)")
+    source.add_argument("--manifest", help="CSV or JSONL manifest with a path per camera (meter, nic)[, artwork, part_id]")
+    source.add_argument("--archive", help="Audit archive directory (ARCHIVE_DIR)")
+    parser.add_argument("--nic-dir", help="Directory of NIC images")
+    parser.add_argument("--artwork", help="Artwork path used when a part does not name one")
+    parser.add_argument("--failed-only", action="store_true", help="With --archive, only parts that failed on the line")
+    parser.add_argument("--set", dest="candidate", action="append", metavar="KEY=VALUE", help="Candidate setting (repeatable)")
+    parser.add_argument("--reference-set", dest="reference", action="append", metavar="KEY=VALUE", help="Reference setting (repeatable)")
+    parser.add_argument("--config", help="Settings file (default: HAWK_CONFIG or ~/.config/Hawk/hawk_settings.conf)")
+    parser.add_argument("--out", default="-", help="Output JSON file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.meter_dir:
+        if not args.nic_dir:
+            parser.error("--meter-dir requires --nic-dir")
+        parts = parts_from_dirs(args.meter_dir, args.nic_dir, args.artwork)
+    elif args.archive:
+        parts = parts_from_archive(os.path.expanduser(args.archive), args.artwork, args.failed_only)
+    else:
+        parts = parts_from_manifest(args.manifest, args.artwork)
+
+    report = compare(parts, parse_overrides(args.reference), parse_overrides(args.candidate))
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(f"Verdict agreement {report['verdict_agreement']:.2%} over {report['counts']['parts']} parts", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
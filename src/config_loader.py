@@ -1,42 +1,541 @@
+"""
+Typed configuration from hawk_settings.conf, with hot reload.
+
+The file is parsed once into an immutable Settings snapshot: every known key is
+checked against SCHEMA (type, range, choices) and derived values (resolution,
+hub port argument, validation and warm-up thresholds) are computed up front.
+Values are read as typed attributes of the current snapshot (CONFIG.WIDTH), so
+SCHEMA owns every default; code that needs several values from one consistent
+version takes CONFIG.snapshot(). Keys SCHEMA does not know are rejected, and a
+settings file that cannot be loaded at startup stops the service.
+
+A watcher thread per process (CONFIG.watch()) polls the settings file and the
+limits files registered with LIMITS by mtime. A changed file is parsed and
+validated in full before the new version is swapped in; one that fails
+validation is rejected and the running version stays in place. Keys marked
+restart=True (worker count, CPU cores, model backends, stream sessions, ...)
+only apply after a restart; everything read per call or re-applied through
+CONFIG.subscribe(), and the limits files, apply immediately.
+"""
+
 import os
+import re
+import json
+import difflib
+import time
+import threading
+from types import MappingProxyType
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+# the .conf file is to be put in this specific directory in the deployment system;
+# HAWK_CONFIG points elsewhere (tools' --config, tests, development machines)
+CONFIG_PATH = os.path.expanduser(os.environ.get("HAWK_CONFIG") or '~/.config/Hawk/hawk_settings.conf')
+
+_CORES = re.compile(r"^\d+(-\d+)?$")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class Field:
+    def __init__(self, kind, default=None, low=None, high=None, choices=None, restart=False):
+        self.kind = kind
+        self.default = default
+        self.low = low
+        self.high = high
+        self.choices = choices
+        self.restart = restart
+
+    def coerce(self, key, value):
+        """Returns the value as this field's type, or raises ConfigError."""
+        kind = self.kind
+        if kind is bool:
+            if isinstance(value, bool) or value in (0, 1):
+                return bool(value)
+            raise ConfigError(f"{key}: expected 0/1 or true/false, got {value!r}")
+        if kind in (int, float):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ConfigError(f"{key}: expected a number, got {value!r}")
+            if kind is int and value != int(value):
+                raise ConfigError(f"{key}: expected a whole number, got {value!r}")
+            value = kind(value)
+            if (self.low is not None and value < self.low) or (self.high is not None and value > self.high):
+                raise ConfigError(f"{key}: {value} outside [{self.low}, {self.high}]")
+        elif kind is str:
+            value = str(value)
+        elif kind is list:
+            value = list(value) if isinstance(value, list) else [value]
+        elif kind == "cores":
+            items = value if isinstance(value, list) else [value]
+            if value != "auto" and not all(_CORES.match(str(item).strip()) for item in items):
+                raise ConfigError(f"{key}: expected core ids like 0, 2,3 or 2-7, got {value!r}")
+        if self.choices is not None and value not in self.choices:
+            raise ConfigError(f"{key}: {value!r} is not one of {list(self.choices)}")
+        return value
+
+
+SCHEMA = {
+    # Hardware interface
+    "YUY_MODE": Field(bool, False),
+    "WIDTH": Field(int, 3264, low=1),
+    "HEIGHT": Field(int, 2448, low=1),
+    "MJPEG_RAW": Field(bool, True),
+    "MJPEG_DECODE_SCALE": Field(int, 1, choices=(1, 2, 4, 8)),
+    # Station and USB
+    "STATION_FILE": Field(str, None, restart=True),
+    "USB_BUS_YUYV_STREAMS": Field(int, 1, low=1, restart=True),
+    "USB_HUB_LOCATION": Field(str, None),
+    "USB_HUB_PORTS": Field(list, []),
+    "METER_HUB_PORT": Field(int, None, low=0, restart=True),
+    "NIC_HUB_PORT": Field(int, None, low=0, restart=True),
+    "METER_PHYSICAL_ID": Field(str, None, restart=True),
+    "NIC_PHYSICAL_ID": Field(str, None, restart=True),
+    "METER_ROTATION": Field(int, 0, choices=(0, 90, 180, 270), restart=True),
+    "NIC_ROTATION": Field(int, 0, choices=(0, 90, 180, 270), restart=True),
+    # Picture validity
+    "BLACK_THRESHOLD": Field(float, 0.99, low=0, high=1),
+    "PIXEL_VAL_THRESHOLD": Field(int, 10, low=0, high=255),
+    "SATURATED_THRESHOLD": Field(float, 0.95, low=0, high=1),
+    "SATURATION_PIXEL_VAL": Field(int, 250, low=0, high=255),
+    "FROZEN_DIFF_THRESHOLD": Field(float, 0.1, low=0),
+    "BLUR_THRESHOLD": Field(float, 0, low=0),
+    "VALIDATION_STRIDE": Field(int, 8, low=1),
+    # Inference workers
+    "INFERENCE_WORKERS": Field(int, 4, low=1, restart=True),
+    "WORKER_MAX_JOBS": Field(int, 0, low=0),
+    "WORKER_MAX_RSS_MB": Field(int, 0, low=0),
+    "WORKER_WARMUP_TIMEOUT": Field(float, 120, low=0),
+    "PIPELINE_TIMEOUT": Field(float, 60, low=0),
+    "PIPELINE_COLLECT_ALL": Field(bool, False),
+    "PRELOAD_PARALLEL": Field(bool, True),
+    "ACCEPT_BEFORE_READY": Field(bool, False),
+    # CPU budget
+    "CPU_PLAN": Field(str, "auto", choices=("auto", "off"), restart=True),
+    "CAPTURE_CORES": Field("cores", None, restart=True),
+    "API_CORES": Field("cores", None, restart=True),
+    "WORKER_CORES": Field("cores", None, restart=True),
+    "WORKER_THREADS": Field(int, None, low=1, restart=True),
+    "API_THREADS": Field(int, 4, low=1, restart=True),
+    # Streaming sessions
+    "CAMERA_STREAMING": Field(bool, False),
+    "STREAM_BUFFER_SIZE": Field(int, 2, low=1, restart=True),
+    "STREAM_FRESH_FRAME": Field(bool, True),
+    "STREAM_FRAME_TIMEOUT": Field(float, 5.0, low=0),
+    "STREAM_RECONNECT_DELAY": Field(float, 1.0, low=0, restart=True),
+    "STREAM_SYNC_WARN_MS": Field(float, 0, low=0),
+    # Sensor warm-up
+    "WARMUP_MODE": Field(str, "fixed", choices=("fixed", "adaptive")),
+    "WARMUP_DEADLINE_MS": Field(float, 1500, low=0),
+    "YUYV_WARMUP_DEADLINE_MS": Field(float, 6000, low=0),
+    "WARMUP_BRIGHTNESS_TOL": Field(float, 2.0, low=0),
+    "WARMUP_DIFF_TOL": Field(float, 3.0, low=0),
+    "WARMUP_SHARPNESS_TOL": Field(float, 0.05, low=0),
+    "WARMUP_STABLE_FRAMES": Field(int, 2, low=1),
+    "WARMUP_GRID_STEP": Field(int, 16, low=1),
+    "WARMUP_MIN_BRIGHTNESS": Field(float, None, low=0, high=255),
+    # Health and recovery
+    "HEALTH_WINDOW": Field(int, 20, low=1, restart=True),
+    "HEALTH_HUB_RESET_AFTER": Field(int, 1, low=1),
+    "HEALTH_DRIVER_RELOAD_AFTER": Field(int, 3, low=1),
+    "USB_RESET_SETTLE_S": Field(float, 2, low=0),
+    "RETRY_RECOVERY_LEVEL": Field(int, 1, low=0, high=2),
+    # Jobs
+    "MAX_ACTIVE_JOBS": Field(int, 2, low=1),
+    "JOB_TTL_S": Field(float, 300, low=0),
+    "MAX_TRACKED_JOBS": Field(int, 100, low=1),
+    "LONG_POLL_MAX_S": Field(float, 30, low=0),
+    "SSE_KEEPALIVE_S": Field(float, 15, low=0),
+    # ROI, artwork, QR
+    "ROI_ENABLED": Field(bool, True),
+    "ROI_PADDING": Field(int, 64, low=0),
+    "ROI_LABEL_MARGIN": Field(int, 256, low=0),
+    "ARTWORK_CACHE_SIZE": Field(int, 4, low=1, restart=True),
+    "QR_TIERS": Field(list, ["opencv:0.5", "opencv:1.0", "qreader:0.5", "qreader:1.0"], restart=True),
+    "QR_REFINE_PADDING": Field(int, 16, low=0),
+    # Audit archive
+    "ARCHIVE_ENABLED": Field(bool, False, restart=True),
+    "ARCHIVE_DIR": Field(str, "~/.local/share/Hawk/archive", restart=True),
+    "ARCHIVE_FORMAT": Field(str, "jpg", choices=("jpg", "jpeg", "webp", "png", "npy"), restart=True),
+    "ARCHIVE_QUALITY": Field(int, 90, low=1, high=100, restart=True),
+    "ARCHIVE_QUOTA_MB": Field(float, 20000, low=0, restart=True),
+    "ARCHIVE_QUEUE_SIZE": Field(int, 4, low=1, restart=True),
+    "ARCHIVE_DEGRADED_SCALE": Field(float, 0.5, low=0.05, high=1, restart=True),
+    # Inference backends and batching
+    "YOLO_BACKEND": Field(str, "native", choices=("native", "onnx"), restart=True),
+    "YOLO_ONNX_MODEL": Field(str, "weights/prod_v1_int8.onnx", restart=True),
+    "YOLO_CLASSES": Field(list, [], restart=True),
+    "YOLO_INPUT_SIZE": Field(int, 640, low=32, restart=True),
+    "YOLO_CONF": Field(float, 0.25, low=0, high=1, restart=True),
+    "YOLO_IOU": Field(float, 0.45, low=0, high=1, restart=True),
+    "OCR_BACKEND": Field(str, "paddle", choices=("paddle", "paddle_hpi"), restart=True),
+    "QR_MODEL_SIZE": Field(str, "s", choices=("n", "s", "m", "l"), restart=True),
+    "BATCH_WINDOW_MS": Field(float, 0, low=0, restart=True),
+    "BATCH_MAX_SIZE": Field(int, 4, low=1, restart=True),
+    # Hot reload
+    "CONFIG_RELOAD_INTERVAL_S": Field(float, 2, low=0, restart=True),
+}
+
+# Keys older settings files may still carry; they are ignored with a warning
+RETIRED = {"ARTWORK_VERIFY_HASH"}
+
+
+def _guess(value):
+    """Converts numeric strings to floats/ints and comma-separated strings to lists."""
+    if "," in value:
+        parsed = []
+        for v in (v.strip() for v in value.split(",")):
+            if v.replace('.', '', 1).replace('-', '', 1).isdigit():
+                parsed.append(float(v) if '.' in v else int(v))
+            else:
+                parsed.append(v)
+        return parsed
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    if value.replace('.', '', 1).isdigit():
+        return float(value) if '.' in value else int(value)
+    return value
+
+def parse_file(path):
+    """Reads key=value lines into a dict of guessed types; raises ConfigError on malformed lines."""
+    raw = {}
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if "=" not in line:
+                raise ConfigError(f"line {number}: expected KEY=VALUE, got {line!r}")
+            key, value = line.split('=', 1)
+            raw[key.strip()] = _guess(value.strip())
+    return raw
+
+def validate(raw):
+    """Typed copy of raw settings; every schema error, unknown keys included, is collected before raising."""
+    values, errors = {}, []
+    for key, value in raw.items():
+        field = SCHEMA.get(key)
+        if field is None:
+            if key in RETIRED:
+                print(f"Config: {key} is no longer used; ignoring it")
+                continue
+            # A misspelt key would otherwise leave the setting silently on its default
+            close = difflib.get_close_matches(key, SCHEMA, n=1)
+            errors.append(f"{key}: unknown key" + (f" (did you mean {close[0]}?)" if close else ""))
+            continue
+        try:
+            values[key] = field.coerce(key, value)
+        except ConfigError as e:
+            errors.append(str(e))
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return values
+
+
+class Settings(Mapping):
+    """One immutable, validated version of the configuration with its derived values."""
+
+    def __init__(self, values, version=0, source=None):
+        self._values = MappingProxyType(dict(values))
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+
+        # Derived values, computed once per version
+        self.resolution = (self.WIDTH, self.HEIGHT)
+        ports = self.USB_HUB_PORTS
+        self.hub_ports = ",".join(str(p) for p in ports)
+        self.validation = MappingProxyType({
+            "black": self.BLACK_THRESHOLD,
+            "pixel": self.PIXEL_VAL_THRESHOLD,
+            "saturated": self.SATURATED_THRESHOLD,
+            "saturation_value": self.SATURATION_PIXEL_VAL,
+            "frozen": self.FROZEN_DIFF_THRESHOLD,
+            "blur": self.BLUR_THRESHOLD,
+            "stride": self.VALIDATION_STRIDE,
+        })
+        self.warmup = MappingProxyType({
+            "brightness_tol": self.WARMUP_BRIGHTNESS_TOL,
+            "diff_tol": self.WARMUP_DIFF_TOL,
+            "sharpness_tol": self.WARMUP_SHARPNESS_TOL,
+            "stable_frames": self.WARMUP_STABLE_FRAMES,
+            "min_brightness": self.PIXEL_VAL_THRESHOLD if self.WARMUP_MIN_BRIGHTNESS is None else self.WARMUP_MIN_BRIGHTNESS,
+            "grid_step": self.WARMUP_GRID_STEP,
+        })
+
+    def __getattr__(self, name):
+        # Typed access with the schema default, e.g. settings.WIDTH
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._values:
+            return self._values[name]
+        if name in SCHEMA:
+            return SCHEMA[name].default
+        raise AttributeError(name)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class LimitsFile:
+    """A limits JSON file, parsed once per version and re-read only when it changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.data = MappingProxyType({})
+        self.version = 0
+        self.error = None
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def load(self):
+        """Parses and checks the file; the previous version stays on any error. Returns True if swapped."""
+        stamp = None
+        try:
+            stamp = self._stamp()
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            check_limits(data)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            if self.version:
+                # Not retried until the file changes again
+                self.stamp = stamp or self.stamp
+                print(f"Limits Reload Error ({self.path}): {e}; keeping version {self.version}")
+                return False
+            raise
+        self.data, self.stamp, self.error = data, stamp, None
+        self.version += 1
+        return True
+
+    def changed(self):
+        try:
+            return self._stamp() != self.stamp
+        except OSError:
+            return False
+
+def check_limits(data):
+    """Structural checks on a limits file: an object, with ordered ranges and QR bounds."""
+    if not isinstance(data, dict):
+        raise ConfigError("limits file must be a JSON object")
+    for label, limit in data.items():
+        if not isinstance(limit, dict):
+            continue
+        for axis in ("x_range", "y_range"):
+            if axis in limit:
+                low, high = limit[axis]
+                if not low <= high:
+                    raise ConfigError(f"{label}.{axis}: {low} > {high}")
+    qr = data.get("qr_limits")
+    if isinstance(qr, dict):
+        for low, high in (("x_min", "x_max"), ("y_min", "y_max")):
+            if low in qr and high in qr and not qr[low] <= qr[high]:
+                raise ConfigError(f"qr_limits: {low} > {high}")
+
+
+class Limits:
+    """Registry of limits files shared by the vision models of a process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def get(self, path):
+        """Current parsed limits of a file, loading it on first use."""
+        entry = self._files.get(path)
+        if entry is None:
+            with self._lock:
+                entry = self._files.get(path)
+                if entry is None:
+                    entry = LimitsFile(path)
+                    entry.load()
+                    self._files[path] = entry
+        return entry.data
+
+    def reload_changed(self):
+        for entry in list(self._files.values()):
+            if entry.changed() and entry.load():
+                print(f"Limits reloaded: {entry.path} (version {entry.version})")
+
+    def status(self):
+        return {path: {"version": e.version, "error": e.error} for path, e in self._files.items()}
+
+
+class Config(Mapping):
+    """
+    The process-wide configuration: a stable handle whose snapshot is swapped
+    atomically on reload. Reads go to the current snapshot.
+    """
+
+    def __init__(self, path, limits):
+        self.path = path
+        self.limits = limits
+        self.last_error = None
+        self._overrides = {}
+        self._raw = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._watcher_pid = None
+        self._current = Settings({})
+        self._initial_load()
+
+    # --- Mapping interface (CONFIG.get, CONFIG[key], key in CONFIG) ---
+
+    def __getitem__(self, key):
+        return self._current[key]
+
+    def __iter__(self):
+        return iter(self._current)
+
+    def __len__(self):
+        return len(self._current)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current, name)
+
+    def snapshot(self):
+        """The current Settings; hold on to it for several reads from one version."""
+        return self._current
+
+    # --- Loading ---
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _initial_load(self):
+        stamp = self._file_stamp()
+        try:
+            raw = parse_file(self.path)
+            settings = Settings(validate(dict(raw, **self._overrides)), 1, self.path)
+        except Exception as e:
+            # Running on defaults would silently ignore the station's settings
+            raise ConfigError(f"Error loading config {self.path} (set HAWK_CONFIG to use another file): {e}") from e
+        self._raw, self._stamp, self._current = raw, stamp, settings
+
+    def reload(self):
+        """
+        Re-reads the settings file. The new version is swapped in only once it has
+        been fully parsed and validated; on any error the running version is kept.
+        Returns True when a new version was swapped in.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            old = self._current
+            try:
+                raw = parse_file(self.path)
+                self._swap(raw)
+            except Exception as e:
+                self.last_error = str(e)
+                self._stamp = stamp
+                print(f"Config Reload Error: {e}; keeping version {old.version}")
+                return False
+            self._stamp = stamp
+            self.last_error = None
+
+        new = self._current
+        restart = sorted(k for k, f in SCHEMA.items() if f.restart and getattr(old, k) != getattr(new, k))
+        if restart:
+            print(f"Config: {', '.join(restart)} changed; takes effect after a restart")
+        return True
+
+    def _swap(self, raw):
+        new = Settings(validate(dict(raw, **self._overrides)), self._current.version + 1, self.path)
+        # A single reference assignment: readers see the old or the new version, never a mix
+        self._raw, self._current = raw, new
+        for listener in list(self._listeners):
+            try:
+                listener(new)
+            except Exception as e:
+                print(f"Config Listener Error: {e}")
+
+    def subscribe(self, listener):
+        """Calls listener(settings) after every swap, for state built from the settings once."""
+        self._listeners.append(listener)
+
+    def override(self, **values):
+        """Fixes keys to values in this process across reloads (benchmarks, comparisons)."""
+        with self._lock:
+            previous = self._overrides
+            self._overrides = dict(previous, **values)
+            try:
+                self._swap(self._raw)
+            except Exception:
+                self._overrides = previous
+                raise
+
+    @contextmanager
+    def overridden(self, **values):
+        """override() for the duration of a with block."""
+        with self._lock:
+            previous = self._overrides
+            self.override(**values)
+        try:
+            yield self._current
+        finally:
+            with self._lock:
+                self._overrides = previous
+                self._swap(self._raw)
+
+    # --- Watching ---
+
+    def watch(self, interval=None):
+        """
+        Starts this process's watcher thread (once per process; forked workers start
+        their own), polling the settings and registered limits files by mtime.
+        """
+        interval = self._current.CONFIG_RELOAD_INTERVAL_S if interval is None else interval
+        if not interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, args=(interval,), name="config-watcher", daemon=True).start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                if self._file_stamp() != self._stamp:
+                    if self.reload():
+                        print(f"Config reloaded: version {self._current.version}")
+                self.limits.reload_changed()
+            except Exception as e:
+                print(f"Config Watcher Error: {e}")
+
+    def status(self):
+        current = self._current
+        return {
+            "path": self.path,
+            "version": current.version,
+            "loaded_at": current.loaded_at,
+            "error": self.last_error,
+            "overrides": sorted(self._overrides),
+            "limits": self.limits.status(),
+        }
+
 
 def load_config():
     """
-    Parses the hawk_settings.conf file present in the expected path.
-    Converts numeric strings to floats/ints and comma-separated strings to lists.
+    Parses the hawk_settings.conf file present in the expected path into a plain,
+    validated dict. Raises OSError or ConfigError when the file is missing or invalid.
     """
-    config_data = {}
-    # the .conf file is to be put in this specific directory in the deployment system
-    config_path = os.path.expanduser('~/.config/Hawk/hawk_settings.conf')
-
-    try:
-        with open(config_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    key, value = line.split('=', 1)
-                    value = value.strip()
-
-                    if "," in value:
-                        parts = [v.strip() for v in value.split(",")]
-                        parsed = []
-                        for v in parts:
-                            if v.replace('.', '', 1).replace('-', '', 1).isdigit():
-                                parsed.append(float(v) if '.' in v else int(v))
-                            else:
-                                parsed.append(v)
-                        value = parsed
-                    elif value.lower() in ("true", "false"):
-                        value = value.lower() == "true"
-                    else:
-                        if value.replace('.', '', 1).isdigit():
-                            value = float(value) if '.' in value else int(value)
-                    
-                    config_data[key.strip()] = value
-        return config_data
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        return {}
-
-# Singleton instance to be used across the app
-CONFIG = load_config()
+    return validate(parse_file(CONFIG_PATH))
+
+# Singleton instances to be used across the app
+LIMITS = Limits()
+CONFIG = Config(CONFIG_PATH, LIMITS)
@@ -0,0 +1,138 @@
+"""
+Cached mapping from udev ID_PATH to /dev/video nodes.
+The cache is filled by reading the udev database and sysfs directly, falling
+back to a udevadm subprocess only for nodes neither source can describe. It is
+rebuilt only when the set of video devices changes or after a hardware reset.
+The filesystem roots are injectable so the resolver can run against a fake tree.
+"""
+
+import os
+import re
+import threading
+import subprocess
+
+# USB interface directory, e.g. "1-2.3:1.0" -> port path "2.3", config.interface "1.0"
+_USB_INTERFACE = re.compile(r"^\d+-([\d.]+):(\d+\.\d+)$")
+# PCI device directory, e.g. "0000:00:14.0"
+_PCI_DEVICE = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-9a-f]$")
+
+
+class DeviceResolver:
+    def __init__(self, sys_root="/sys", dev_root="/dev", udev_data_root="/run/udev/data", use_udevadm=True):
+        self.sys_root = sys_root
+        self.dev_root = dev_root
+        self.udev_data_root = udev_data_root
+        self.use_udevadm = use_udevadm
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._idpath_to_dev = {}
+        self.rebuilds = 0
+
+    @property
+    def _class_dir(self):
+        return os.path.join(self.sys_root, "class", "video4linux")
+
+    def invalidate(self):
+        """Forces a rebuild on the next lookup, e.g. after a USB or driver reset."""
+        with self._lock:
+            self._signature = None
+
+    def resolve(self, id_path):
+        """Returns the capture node for an ID_PATH, or None if no such device is present."""
+        return self.mapping().get(id_path)
+
+    def mapping(self):
+        signature = self._current_signature()
+        with self._lock:
+            if signature != self._signature:
+                self._idpath_to_dev = self._scan(signature)
+                self._signature = signature
+                self.rebuilds += 1
+            return dict(self._idpath_to_dev)
+
+    def _current_signature(self):
+        """Cheap fingerprint of the device set: node names and their major:minor numbers."""
+        try:
+            names = sorted(os.listdir(self._class_dir))
+        except OSError:
+            return ()
+        return tuple((name, self._read(os.path.join(self._class_dir, name, "dev"))) for name in names)
+
+    def _scan(self, signature):
+        candidates = {}
+        for name, devnum in signature:
+            if not name.startswith("video"):
+                continue
+            entry = os.path.join(self._class_dir, name)
+            node = os.path.join(self.dev_root, name)
+
+            id_path = (self._id_path_from_udev_db(devnum)
+                       or self._id_path_from_sysfs(entry)
+                       or self._id_path_from_udevadm(node))
+            if not id_path:
+                continue
+
+            # UVC cameras expose a capture node and a metadata node with the same ID_PATH;
+            # the capture node has the lowest index
+            index = self._read(os.path.join(entry, "index"))
+            rank = (int(index) if index and index.isdigit() else 0, int(name[5:]) if name[5:].isdigit() else 0)
+            if id_path not in candidates or rank < candidates[id_path][0]:
+                candidates[id_path] = (rank, node)
+
+        return {id_path: node for id_path, (_, node) in candidates.items()}
+
+    def _id_path_from_udev_db(self, devnum):
+        if not devnum:
+            return None
+        content = self._read(os.path.join(self.udev_data_root, f"c{devnum}"))
+        for line in (content or "").splitlines():
+            if line.startswith("E:ID_PATH="):
+                return line.split("=", 1)[1]
+        return None
+
+    def _id_path_from_sysfs(self, entry):
+        """Rebuilds udev's path_id for a USB camera from the resolved sysfs device path."""
+        try:
+            parts = os.path.realpath(os.path.join(entry, "device")).split(os.sep)
+        except OSError:
+            return None
+
+        usb = None
+        pci = None
+        for part in parts:
+            match = _USB_INTERFACE.match(part)
+            if match:
+                usb = f"usb-0:{match.group(1)}:{match.group(2)}"
+                break
+            if _PCI_DEVICE.match(part):
+                pci = f"pci-{part}"
+
+        if not usb or not pci:
+            return None
+        return f"{pci}-{usb}"
+
+    def _id_path_from_udevadm(self, node):
+        if not self.use_udevadm:
+            return None
+        try:
+            output = subprocess.check_output(["udevadm", "info", "--name", node],
+                                             universal_newlines=True)
+        except (subprocess.CalledProcessError, OSError):
+            return None
+        for line in output.splitlines():
+            if line.startswith("E: ID_PATH="):
+                return line.split("=", 1)[1]
+        return None
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+
+# Singleton resolver for the real system
+RESOLVER = DeviceResolver()
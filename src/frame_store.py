@@ -0,0 +1,116 @@
+"""
+Shared-memory frame store for handing captured frames to the vision workers.
+A frame is written into a shared segment once and workers receive only a small
+FrameHandle (name, shape, dtype, scale) instead of a pickled copy of the full image.
+scale is the factor from the frame's pixels to full-resolution ones: N for a
+1/N reduced decode, carried from capture (or the archive) so the stages never
+have to guess it from the frame size.
+"""
+
+import os
+import atexit
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+FrameHandle = namedtuple("FrameHandle", ["name", "shape", "dtype", "scale"], defaults=(1,))
+
+
+class ScaledFrame(np.ndarray):
+    """A frame array that remembers its scale; views and slices of it keep it."""
+    scale = 1
+
+    def __array_finalize__(self, obj):
+        self.scale = getattr(obj, "scale", 1)
+
+def with_scale(frame, scale):
+    """Tags a frame with its scale (see frame_scale); frames at full resolution stay plain arrays."""
+    if frame is None or scale == 1:
+        return frame
+    frame = frame.view(ScaledFrame)
+    frame.scale = scale
+    return frame
+
+def frame_scale(image):
+    """Scale of a frame or FrameHandle: N for a 1/N reduced frame, 1 at full resolution."""
+    return getattr(image, "scale", 1) or 1
+
+# POSIX shared memory segments are exposed as files here on Linux
+SHM_ROOT = "/dev/shm"
+
+
+class FrameStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segments = {}
+
+    def put(self, img):
+        """Copies a frame into a new shared segment and returns its handle."""
+        scale = frame_scale(img)
+        img = np.ascontiguousarray(img)
+        shm = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+        view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+        view[...] = img
+        del view
+
+        handle = FrameHandle(shm.name, tuple(img.shape), img.dtype.str, scale)
+        with self._lock:
+            self._segments[shm.name] = shm
+        return handle
+
+    def release(self, handle):
+        """Frees a segment. Workers still attached keep their mapping until they close it."""
+        with self._lock:
+            shm = self._segments.pop(handle.name, None)
+        if shm is None:
+            return
+        try:
+            shm.close()
+        finally:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def release_all(self):
+        with self._lock:
+            names = list(self._segments)
+        for name in names:
+            self.release(FrameHandle(name, None, None))
+
+    def live_segments(self):
+        with self._lock:
+            return len(self._segments)
+
+    @contextmanager
+    def lease(self, *imgs):
+        """Writes frames into the store for the duration of a job; segments are freed on exit, even on error."""
+        handles = []
+        try:
+            for img in imgs:
+                handles.append(None if img is None else self.put(img))
+            yield handles
+        finally:
+            for handle in handles:
+                if handle is not None:
+                    self.release(handle)
+
+
+def load_frame(image):
+    """
+    Worker-side accessor. Returns an ndarray for either a FrameHandle or a plain
+    array, so vision functions accept both. Handles are mapped copy-on-write, so
+    the mapping is released with the last reference and the worker never needs
+    to close it or register it with a resource tracker.
+    """
+    if not isinstance(image, FrameHandle):
+        return image
+    path = os.path.join(SHM_ROOT, image.name.lstrip("/"))
+    return np.memmap(path, dtype=np.dtype(image.dtype), mode="c", shape=image.shape)
+
+
+# Singleton store owned by the API process
+STORE = FrameStore()
+atexit.register(STORE.release_all)
@@ -0,0 +1,101 @@
+"""
+Frame validity engine.
+Works on a strided view of the frame converted to integer luma in one pass, so
+no full-size float temporaries are created. Detects missing, black, saturated,
+frozen (unchanged since the previous capture of the same camera) and blurry
+frames, and returns a structured verdict instead of a bool.
+"""
+
+import threading
+import cv2
+import numpy as np
+from config_loader import CONFIG
+
+# Reason codes
+VALID = "ok"
+MISSING = "missing"
+BLACK = "black"
+SATURATED = "saturated"
+FROZEN = "frozen"
+BLURRY = "blurry"
+ERROR = "error"
+
+
+def luma_grid(img, step):
+    """Integer luma of every step-th pixel; only the small grid is ever copied."""
+    grid = np.ascontiguousarray(img[::step, ::step])
+    if grid.ndim == 3 and grid.shape[2] == 3:
+        return cv2.cvtColor(grid, cv2.COLOR_BGR2GRAY)
+    if grid.ndim == 3:
+        return np.ascontiguousarray(grid[:, :, 0])
+    return grid
+
+
+class FrameValidator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous = {}
+
+    def validate(self, img, key=None):
+        """
+        Returns {"valid", "reason", "metrics"}. With a key (camera name), the frame
+        is also compared with the previous frame validated under that key.
+        """
+        if img is None:
+            return {"valid": False, "reason": MISSING, "metrics": {}}
+
+        # Thresholds of the current config version, validated and grouped when it was loaded
+        limits = CONFIG.validation
+        black_threshold = limits["black"]
+        pixel_threshold = limits["pixel"]
+        saturated_threshold = limits["saturated"]
+        saturation_value = limits["saturation_value"]
+        frozen_threshold = limits["frozen"]
+        blur_threshold = limits["blur"]
+        step = limits["stride"]
+
+        try:
+            gray = luma_grid(img, step)
+            size = gray.size
+            metrics = {
+                "black_ratio": float(np.count_nonzero(gray <= pixel_threshold)) / size,
+                "saturated_ratio": float(np.count_nonzero(gray >= saturation_value)) / size,
+            }
+        except Exception as e:
+            return {"valid": False, "reason": ERROR, "metrics": {"error": str(e)}}
+
+        with self._lock:
+            previous = self._previous.get(key) if key is not None else None
+            if key is not None:
+                self._previous[key] = gray
+
+        reason = VALID
+        if metrics["black_ratio"] >= black_threshold:
+            reason = BLACK
+        elif metrics["saturated_ratio"] >= saturated_threshold:
+            reason = SATURATED
+        else:
+            if previous is not None and previous.shape == gray.shape:
+                diff = float(cv2.absdiff(gray, previous).mean())
+                metrics["frame_diff"] = diff
+                if diff <= frozen_threshold:
+                    reason = FROZEN
+            if reason == VALID and blur_threshold:
+                sharpness = float(cv2.Laplacian(gray, cv2.CV_16S).var())
+                metrics["sharpness"] = sharpness
+                if sharpness < blur_threshold:
+                    reason = BLURRY
+
+        return {"valid": reason == VALID, "reason": reason, "metrics": metrics}
+
+    def forget(self, key=None):
+        """Drops the stored previous frame for one camera, or for all cameras."""
+        with self._lock:
+            if key is None:
+                self._previous.clear()
+            else:
+                self._previous.pop(key, None)
+
+
+# Singleton validator shared by capture and recovery
+VALIDATOR = FrameValidator()
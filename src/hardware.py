@@ -1,52 +1,167 @@
 import cv2
 import time
+import threading
 import subprocess
-import glob
-import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 from config_loader import CONFIG  
-
-def capture_both_cameras(meter_port, nic_port):
-    """Parallelized capture for dual camera setup using resolved device nodes."""
-    # Fetch rotation settings from config
-    meter_rotation = CONFIG.get("METER_ROTATION", 0)
-    nic_rotation = CONFIG.get("NIC_ROTATION", 0)
-
-    capture_config_meter = {"device": meter_port, "rotation": meter_rotation}
-    capture_config_nic = {"device": nic_port, "rotation": nic_rotation}
-
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = [
-            executor.submit(capture_cam, capture_config_meter),
-            executor.submit(capture_cam, capture_config_nic)
-        ]
-
-        results = []
-        for future in futures:
-            try:
-                # 15s timeout to account for low FPS YUYV warm-up cycles
-                frame = future.result(timeout=15) 
-                results.append(frame)
-            except Exception as e:
-                print(f"Capture Thread Error: {e}")
-                results.append(None)
-
+from camera_session import get_session, close_all_sessions
+from warmup import adaptive_warmup
+from device_resolver import RESOLVER
+from frame_validation import VALIDATOR
+from frame_store import with_scale
+from metrics import span
+from resources import get_plan
+from station import STATION
+
+def capture_both_cameras(meter_port, nic_port, with_timestamps=False):
+    """
+    Parallelized capture for dual camera setup using resolved device nodes.
+    With with_timestamps, returns (frame, monotonic timestamp) pairs instead of bare frames.
+    """
+    results = capture_cameras({"meter": meter_port, "nic": nic_port}, with_timestamps=True)
+    pairs = [results["meter"], results["nic"]]
+    if with_timestamps:
+        return pairs
+    return [frame for frame, _ in pairs]
+
+def capture_cameras(ports, with_timestamps=False):
+    """
+    Parallelized capture of any subset of the station's cameras. ports maps camera
+    name to its device node; rotation and format come from the station definition.
+    YUYV cameras sharing a USB bus are staggered (see _bus_slot).
+    Returns {camera: frame}, or {camera: (frame, timestamp)} with with_timestamps.
+    """
+    cameras = list(ports)
+    cam_configs = []
+    for camera in cameras:
+        spec = STATION.camera(camera)
+        cam_configs.append({"camera": camera, "device": ports[camera], "rotation": spec.rotation,
+                            "format": spec.format, "bus": spec.bus, "decode_scale": spec.decode_scale()})
+
+    if CONFIG.CAMERA_STREAMING:
+        results = _capture_from_sessions(cam_configs)
+    else:
+        # 15s per capture to account for low FPS YUYV warm-up cycles, times the staggered rounds on the busiest bus
+        timeout = 15 * _stagger_rounds(cam_configs)
+        with ThreadPoolExecutor(max_workers=max(len(cam_configs), 1)) as executor:
+            futures = [executor.submit(_capture_stamped, cam_args) for cam_args in cam_configs]
+
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=timeout))
+                except Exception as e:
+                    print(f"Capture Thread Error: {e}")
+                    results.append((None, None))
+
+    _check_sync(results)
+    if with_timestamps:
+        return dict(zip(cameras, results))
+    return {camera: frame for camera, (frame, _) in zip(cameras, results)}
+
+# A full-resolution YUYV stream reserves most of a USB 2 bus's isochronous bandwidth;
+# a second one opened alongside it fails to start, so YUYV captures take a slot per bus
+_bus_slots = {}
+_bus_slots_lock = threading.Lock()
+# Read once: the semaphores and the stagger timeout must agree (USB_BUS_YUYV_STREAMS is restart-only)
+_BUS_STREAMS = CONFIG.USB_BUS_YUYV_STREAMS
+
+def _bus_slot(bus):
+    with _bus_slots_lock:
+        slot = _bus_slots.get(bus)
+        if slot is None:
+            slot = _bus_slots[bus] = threading.BoundedSemaphore(_BUS_STREAMS)
+        return slot
+
+def _stagger_rounds(cam_configs):
+    """Number of YUYV captures queued behind each other on the busiest bus."""
+    per_bus = {}
+    for cam_args in cam_configs:
+        if cam_args.get("format") == "yuyv" and cam_args.get("bus"):
+            per_bus[cam_args["bus"]] = per_bus.get(cam_args["bus"], 0) + 1
+    slots = _BUS_STREAMS
+    return max([-(-count // slots) for count in per_bus.values()] + [1])
+
+def _capture_stamped(cam_args):
+    # Capture threads run on the reserved capture cores
+    get_plan().pin("capture")
+    if cam_args.get("format") == "yuyv" and cam_args.get("bus"):
+        with _bus_slot(cam_args["bus"]):
+            with span("capture", camera=cam_args.get("camera")):
+                frame = capture_cam(cam_args)
+    else:
+        with span("capture", camera=cam_args.get("camera")):
+            frame = capture_cam(cam_args)
+    return frame, time.monotonic()
+
+def _capture_from_sessions(cam_configs):
+    """Takes frames from the always-open streaming sessions instead of opening the devices."""
+    # By default only frames read after the trigger are accepted
+    trigger = time.monotonic() if CONFIG.STREAM_FRESH_FRAME else None
+    timeout = CONFIG.STREAM_FRAME_TIMEOUT
+
+    results = []
+    for cam_args in cam_configs:
+        try:
+            if cam_args["device"] is None:
+                raise RuntimeError("Camera device not resolved")
+            with span("capture", camera=cam_args.get("camera")):
+                ts, frame = get_session(cam_args["device"], cam_args.get("format") == "yuyv").latest(newer_than=trigger, timeout=timeout)
+            results.append((_rotate_frame(frame, cam_args.get("rotation", 0)), ts))
+        except Exception as e:
+            print(f"Capture Session Error: {e}")
+            results.append((None, None))
     return results
 
+def _check_sync(results):
+    """Warns when the cameras' frames were taken further apart than allowed."""
+    stamps = [ts for _, ts in results if ts is not None]
+    if len(stamps) < 2:
+        return
+    skew_ms = (max(stamps) - min(stamps)) * 1000
+    limit_ms = CONFIG.STREAM_SYNC_WARN_MS
+    if limit_ms and skew_ms > limit_ms:
+        print(f"Camera Sync Warning: frames {skew_ms:.0f} ms apart")
+
 def capture_cam(cam_args):
-    """Routes to specific capture method based on config format setting."""
+    """Routes to specific capture method based on the camera's format (YUY_MODE when unset)."""
     device = cam_args['device']
     rotation = cam_args.get('rotation', 0)
+    if device is None:
+        raise RuntimeError("Camera device not resolved")
     
-    # Use config value for YUY_MODE (True/1 or False/0)
-    if not CONFIG.get("YUY_MODE"):
-        return capture_mjpeg_image(device, rotation)
+    fmt = cam_args.get("format") or ("yuyv" if CONFIG.YUY_MODE else "mjpeg")
+    if fmt == "mjpeg":
+        return capture_mjpeg_image(device, rotation, cam_args.get("decode_scale", 1))
     return capture_yuyv_image(device, rotation)
 
-def capture_mjpeg_image(device, rotation):
-    """High-speed MJPEG capture with sensor warm-up."""
-    width = CONFIG.get("WIDTH", 3264)
-    height = CONFIG.get("HEIGHT", 2448)
+# imdecode flags for decoding at 1/scale resolution directly from the DCT coefficients
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+def decode_jpeg(raw, scale=1):
+    """
+    Decodes a raw MJPEG buffer to BGR at 1/scale resolution (1, 2, 4 or 8).
+    Frames the backend already decoded (it ignored CONVERT_RGB=0) pass through unchanged.
+    """
+    if raw is None or raw.ndim == 3:
+        return raw
+    return cv2.imdecode(raw.reshape(-1), _DECODE_FLAGS.get(int(scale), cv2.IMREAD_COLOR))
+
+def capture_mjpeg_image(device, rotation, decode_scale=1):
+    """
+    High-speed MJPEG capture with sensor warm-up.
+    With MJPEG_RAW the driver's JPEG buffers are kept compressed: warm-up frames are
+    skipped with grab() or judged on a 1/8-scale decode, and only the selected frame
+    is decoded, at full resolution or, for cameras whose checks all tolerate it
+    (CameraSpec.decode_scale), at 1/decode_scale.
+    """
+    width, height = CONFIG.resolution
+    raw_mode = CONFIG.MJPEG_RAW
 
     subprocess.run([
         "v4l2-ctl", "-d", device,
@@ -60,23 +175,36 @@ def capture_mjpeg_image(device, rotation):
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
     cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*'MJPG'))
+    if raw_mode:
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+    if CONFIG.WARMUP_MODE == "adaptive":
+        preview = (lambda raw: decode_jpeg(raw, 8)) if raw_mode else None
+        frame, _ = adaptive_warmup(cap, device, CONFIG.WARMUP_DEADLINE_MS, preview=preview, preview_scale=8)
+    else:
+        # grab() dequeues a buffer without converting it
+        for _ in range(10):
+            cap.grab()
+            time.sleep(0.02)
 
-    for _ in range(10):
-        cap.read()
-        time.sleep(0.02)
-
-    ret, frame = cap.read()
+        ret, frame = cap.read()
+        if not ret:
+            frame = None
     cap.release()
 
-    if not ret or frame is None:
+    # Frames the backend already decoded are at full resolution
+    scale = decode_scale if frame is not None and raw_mode and frame.ndim != 3 else 1
+    if frame is not None and raw_mode:
+        frame = decode_jpeg(frame, decode_scale)
+    if frame is None:
         raise RuntimeError("MJPEG capture failed")
 
-    return _rotate_frame(frame, rotation)
+    # Rotation runs once, on the selected (possibly reduced) frame only; the frame carries its scale
+    return with_scale(_rotate_frame(frame, rotation), scale)
 
 def capture_yuyv_image(device, rotation):
     """Reliable YUYV capture for high-fidelity signal."""
-    width = CONFIG.get("WIDTH", 3264)
-    height = CONFIG.get("HEIGHT", 2448)
+    width, height = CONFIG.resolution
 
     subprocess.run([
         "v4l2-ctl", "-d", device,
@@ -92,16 +220,19 @@ def capture_yuyv_image(device, rotation):
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
     cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*'YUYV'))
 
-    for _ in range(5):
-        cap.read()
-        time.sleep(0.75)
+    if CONFIG.WARMUP_MODE == "adaptive":
+        frame, _ = adaptive_warmup(cap, device, CONFIG.YUYV_WARMUP_DEADLINE_MS)
+    else:
+        for _ in range(5):
+            cap.read()
+            time.sleep(0.75)
 
-    frame = None
-    for _ in range(3):
-        ret, frame = cap.read()
-        if ret and frame is not None:
-            break
-        time.sleep(0.75)
+        frame = None
+        for _ in range(3):
+            ret, frame = cap.read()
+            if ret and frame is not None:
+                break
+            time.sleep(0.75)
 
     cap.release()
     if frame is None:
@@ -119,73 +250,74 @@ def _rotate_frame(frame, rotation):
         return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
     return frame
 
-def reset_usb_hub():
-    """Power cycles cameras via uhubctl using config-defined hub/ports."""
-    hub_loc = CONFIG.get("USB_HUB_LOCATION")
-    ports = CONFIG.get("USB_HUB_PORTS", [])
-
-    if not hub_loc or not ports:
+def reset_usb_hub(ports=None):
+    """
+    Power cycles cameras via uhubctl using config-defined hub/ports.
+    ports restricts the cycle to specific hub ports, e.g. a single camera's.
+    """
+    hub_loc = CONFIG.USB_HUB_LOCATION
+    if ports is None:
+        # uhubctl port argument of USB_HUB_PORTS, built when the config was loaded
+        ports_str = CONFIG.hub_ports
+    else:
+        ports_str = ",".join(str(p) for p in ports) if isinstance(ports, list) else str(ports)
+
+    if not hub_loc or not ports_str:
         return
 
-    ports_str = ",".join(str(p) for p in ports) if isinstance(ports, list) else str(ports)
+    # Streaming sessions hold the devices open; release them before the power cycle
+    close_all_sessions()
 
     try:
-        subprocess.run(["sudo", "uhubctl", "-l", hub_loc, "-p", ports_str, "-a", "2"], 
-                       check=True, capture_output=True)
-        time.sleep(1)
-        subprocess.run(["sudo", "uhubctl", "-l", hub_loc, "-p", ports_str, "-a", "1"], 
-                       check=True, capture_output=True)
+        with span("usb_hub_reset"):
+            subprocess.run(["sudo", "uhubctl", "-l", hub_loc, "-p", ports_str, "-a", "2"], 
+                           check=True, capture_output=True)
+            time.sleep(1)
+            subprocess.run(["sudo", "uhubctl", "-l", hub_loc, "-p", ports_str, "-a", "1"], 
+                           check=True, capture_output=True)
     except subprocess.CalledProcessError as e:
         print(f"USB Hub Reset Error: {e.stderr}")
+    finally:
+        # Nodes may be renumbered when the cameras re-enumerate
+        RESOLVER.invalidate()
 
 def reset_v4l2_driver():
     """Kernel-level reload of the uvcvideo driver."""
+    close_all_sessions()
     try:
-        subprocess.run("sudo modprobe -r uvcvideo", shell=True, check=True)
-        time.sleep(1)
-        subprocess.run("sudo modprobe uvcvideo", shell=True, check=True)
-        time.sleep(2)
+        with span("driver_reload"):
+            subprocess.run("sudo modprobe -r uvcvideo", shell=True, check=True)
+            time.sleep(1)
+            subprocess.run("sudo modprobe uvcvideo", shell=True, check=True)
+            time.sleep(2)
         return True
     except subprocess.CalledProcessError:
         return False
+    finally:
+        RESOLVER.invalidate()
 
 def is_invalid_image(img):
     """Validates frame integrity against sensor-level noise or black frames."""
-    if img is None:
-        return True
-    
-    black_threshold = CONFIG.get("BLACK_THRESHOLD", 0.99)
-    pixel_threshold = CONFIG.get("PIXEL_VAL_THRESHOLD", 10)
-
-    try:
-        gray = np.mean(img, axis=2) if len(img.shape) == 3 else img
-        black_pixels = np.sum(gray <= pixel_threshold)
-        return (black_pixels / gray.size) >= black_threshold
-    except Exception:
-        return True
+    return not VALIDATOR.validate(img)["valid"]
+
+def resolve_ports(cameras=None):
+    """
+    Maps the station cameras' physical ID_PATHs to /dev/video nodes through the cached
+    resolver. A camera that is not present resolves to None instead of a guessed node.
+    """
+    cameras = STATION.names() if cameras is None else cameras
+    with span("port_resolution"):
+        ports = {camera: RESOLVER.resolve(STATION.camera(camera).physical_id) for camera in cameras}
+
+    for camera, port in ports.items():
+        if port is None:
+            print(f"Port Resolution Error: {camera} camera {STATION.camera(camera).physical_id} not found")
+    return ports
 
 def resolve_camera_ports():
-    """Maps physical ID_PATHs to /dev/video nodes via udevadm."""
-    meter_id = CONFIG.get("METER_PHYSICAL_ID")
-    nic_id = CONFIG.get("NIC_PHYSICAL_ID")
-    
-    idpath_to_dev = {}
-    for dev in glob.glob("/dev/video*"):
-        try:
-            output = subprocess.check_output(["udevadm", "info", "--name", dev], 
-                                           universal_newlines=True)
-            for line in output.splitlines():
-                if line.startswith("E: ID_PATH="):
-                    id_path = line.split("=", 1)[1]
-                    idpath_to_dev[id_path] = dev
-                    break
-        except subprocess.CalledProcessError:
-            continue
-
-    meter_port = idpath_to_dev.get(meter_id, "/dev/video0")
-    nic_port = idpath_to_dev.get(nic_id, "/dev/video2")
-    
-    return meter_port, nic_port
+    """(meter, nic) device nodes of the two-camera preset."""
+    ports = resolve_ports(("meter", "nic"))
+    return ports["meter"], ports["nic"]
 
 def configure_camera(device, exposure_val=500):
     """Utility to set manual exposure values via v4l2-ctl."""
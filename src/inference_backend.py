@@ -0,0 +1,114 @@
+"""
+CPU inference backends for the vision models, selected per model in hawk_settings.conf.
+
+    YOLO_BACKEND=native   the framework the detector was trained with
+    YOLO_BACKEND=onnx     ONNX Runtime on an exported model (FP32, FP16 or INT8/QDQ),
+                          YOLO_ONNX_MODEL; images of a batch run in one forward pass
+    OCR_BACKEND=paddle     PaddleOCR on Paddle Inference
+    OCR_BACKEND=paddle_hpi PaddleOCR high-performance inference (ONNX Runtime/OpenVINO)
+    QR_MODEL_SIZE          QReader detector size (n, s, m, l)
+
+onnxruntime is imported only when an ONNX backend is built.
+"""
+
+import numpy as np
+import cv2
+from config_loader import CONFIG
+from resources import get_plan
+
+
+def letterbox(image, size):
+    """
+    Resizes keeping aspect ratio and pads to size x size. Returns the padded
+    image, the scale and the (x, y) padding, to map boxes back.
+    """
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return canvas, scale, (pad_x, pad_y)
+
+
+class OnnxDetector:
+    """YOLO (v8-style output: [batch, 4 + classes, anchors]) on ONNX Runtime."""
+
+    def __init__(self, model_path, class_names, input_size=640, conf=0.25, iou=0.45, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or get_plan().worker_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # FP16 exports take half-precision input; INT8 (QDQ) exports keep float input
+        self.dtype = np.float16 if "float16" in model_input.type else np.float32
+        # A fixed batch dimension means the export only takes one image per call
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        self.class_names = list(class_names)
+        self.input_size = input_size
+        self.conf = conf
+        self.iou = iou
+
+    def detect(self, images):
+        """Detections for each image, in that image's pixel coordinates."""
+        prepared = [letterbox(image, self.input_size) for image in images]
+        blob = np.stack([p[0] for p in prepared])[..., ::-1].transpose(0, 3, 1, 2)
+        blob = np.ascontiguousarray(blob, dtype=self.dtype) / self.dtype(255.0)
+
+        step = self.max_batch or len(images)
+        outputs = []
+        for i in range(0, len(images), step):
+            outputs.extend(self.session.run(None, {self.input_name: blob[i:i + step]})[0])
+        return [self._postprocess(out, scale, pad) for out, (_, scale, pad) in zip(outputs, prepared)]
+
+    def _postprocess(self, output, scale, pad):
+        predictions = np.asarray(output, dtype=np.float32).T
+        scores = predictions[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences >= self.conf
+        if not keep.any():
+            return []
+
+        boxes, classes, confidences = predictions[keep, :4], classes[keep], confidences[keep]
+        # cx, cy, w, h in letterboxed pixels -> x, y, w, h in image pixels
+        xywh = np.empty_like(boxes)
+        xywh[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad[0]) / scale
+        xywh[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad[1]) / scale
+        xywh[:, 2] = boxes[:, 2] / scale
+        xywh[:, 3] = boxes[:, 3] / scale
+
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), confidences.tolist(), self.conf, self.iou)
+        detections = []
+        for i in np.array(indices).reshape(-1):
+            x, y, w, h = xywh[i]
+            label = self.class_names[classes[i]] if classes[i] < len(self.class_names) else str(classes[i])
+            detections.append({"label": label, "bbox": [float(x), float(y), float(x + w), float(y + h)], "conf": float(confidences[i])})
+        return detections
+
+
+def build_yolo_backend():
+    """The configured ONNX detector, or None for the native framework."""
+    if CONFIG.YOLO_BACKEND != "onnx":
+        return None
+    classes = CONFIG.YOLO_CLASSES
+    return OnnxDetector(
+        CONFIG.YOLO_ONNX_MODEL,
+        classes if isinstance(classes, list) else [classes],
+        input_size=CONFIG.YOLO_INPUT_SIZE,
+        conf=CONFIG.YOLO_CONF,
+        iou=CONFIG.YOLO_IOU
+    )
+
+def paddle_options():
+    """Extra PaddleOCR arguments for the configured OCR backend."""
+    if CONFIG.OCR_BACKEND == "paddle_hpi":
+        return {"enable_hpi": True}
+    return {}
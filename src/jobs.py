@@ -0,0 +1,203 @@
+"""
+Job registry for the /printcheck API.
+Every cmd 3 request becomes a job with its own ID, state, futures, retry flag
+and timings, so overlapping parts never overwrite each other. A bounded number
+of jobs may be in flight at once, and finished jobs are evicted after a TTL.
+Jobs are numbered in cmd 3 order, so a retry can tell that the next part has
+already been presented and must not be re-captured for an older one.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from config_loader import CONFIG
+
+# Job states
+CAPTURING = "capturing"
+PROCESSING = "processing"
+RETRY_PENDING = "retry_pending"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, data, seq=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.seq = seq
+        self.data = data
+        self.state = CAPTURING
+        self.future = None
+        self.retry_future = None
+        self.retry_attempted = False
+        self.error = None
+        self.lock = threading.Lock()
+
+        # Stage-level events for push delivery; the condition guards them and the state,
+        # and wakes event streams and long polls on every event or state change
+        self.events = []
+        self._cond = threading.Condition()
+
+        self.created = time.monotonic()
+        self.finished = None
+        self.timings = {}
+
+    def mark(self, name):
+        """Records milliseconds since job creation for a named milestone."""
+        self.timings[name] = round((time.monotonic() - self.created) * 1000, 1)
+
+    def emit(self, event, **payload):
+        """Appends a stage-level event and wakes any stream waiting on this job."""
+        with self._cond:
+            entry = {"event": event, "t_ms": round((time.monotonic() - self.created) * 1000, 1)}
+            entry.update(payload)
+            self.events.append(entry)
+            self._cond.notify_all()
+
+    def events_since(self, index, timeout):
+        """Returns events from index on, waiting up to timeout for new ones."""
+        with self._cond:
+            if index >= len(self.events) and self.is_active():
+                self._cond.wait(timeout)
+            return self.events[index:]
+
+    def wait(self, timeout):
+        """Blocks until the job is finished, at most timeout seconds in total. Returns True when it is."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.is_active():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _set_state(self, state):
+        """Changes state with the condition held and wakes its waiters."""
+        self.state = state
+        if state in (DONE, FAILED):
+            self.finished = time.monotonic()
+        self._cond.notify_all()
+
+    def attach(self, future, retry=False):
+        """Hands the job over to a processing future resolving to a processor.run_pipeline result."""
+        with self._cond:
+            if retry:
+                self.retry_future = future
+                self.finished = None
+            else:
+                self.future = future
+            self._set_state(RETRYING if retry else PROCESSING)
+        self.mark("retry_submitted" if retry else "submitted")
+        future.add_done_callback(lambda f: self._on_done(f, retry))
+
+    def fail(self, error):
+        with self._cond:
+            self.error = error
+            self._set_state(FAILED)
+            self.mark("failed")
+            self.emit("failed", reason=error)
+
+    def settle(self):
+        """Ends a job awaiting its retry on its first verdict, without re-capturing."""
+        with self._cond:
+            self._set_state(DONE)
+            self.mark("retry_skipped")
+            self.emit("retry_skipped", reason="Next part already presented")
+
+    def is_active(self):
+        return self.state in (CAPTURING, PROCESSING, RETRY_PENDING, RETRYING)
+
+    def current_future(self):
+        return self.retry_future if self.retry_attempted else self.future
+
+    def summary(self):
+        return {"jobId": self.id, "state": self.state, "timings": dict(self.timings), "error": self.error}
+
+    def _on_done(self, future, retry):
+        self.mark("retry_done" if retry else "done")
+        # State and final event change together, so a stream never sees a finished job without its verdict
+        with self._cond:
+            if future.cancelled() or future.exception() is not None:
+                data = None
+                self.emit("error", retry=retry, reason=str(future.exception()) if not future.cancelled() else "cancelled")
+            else:
+                data = future.result()["response"].get("data", {})
+                self.emit("verdict", retry=retry, data=data)
+
+            # A failed first result may still be retried; the job stays active until that is decided
+            if not retry and data is not None and not data.get("success") and not self.retry_attempted:
+                self._set_state(RETRY_PENDING)
+            else:
+                self._set_state(DONE)
+
+
+class JobRegistry:
+    def __init__(self, max_active=2, ttl_s=300, max_jobs=100):
+        self.max_active = max_active
+        self.ttl_s = ttl_s
+        self.max_jobs = max_jobs
+
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._seq = 0
+
+    def create(self, data):
+        """Registers a new job, or returns None when max_active jobs are already in flight."""
+        with self._lock:
+            self._evict()
+            if sum(1 for job in self._jobs.values() if job.is_active()) >= self.max_active:
+                return None
+            self._seq += 1
+            job = Job(data, self._seq)
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def superseded(self, job):
+        """True once a later cmd 3 has registered a job, i.e. the next part is in front of the cameras."""
+        with self._lock:
+            return self._seq > job.seq
+
+    def latest(self):
+        """Most recently created job, used by clients that poll without a job ID."""
+        with self._lock:
+            self._evict()
+            return next(reversed(self._jobs.values()), None)
+
+    def summaries(self):
+        with self._lock:
+            return [job.summary() for job in self._jobs.values()]
+
+    def _evict(self):
+        now = time.monotonic()
+        # Jobs still in flight or awaiting their retry are never expired
+        for job_id in [j.id for j in self._jobs.values()
+                       if not j.is_active() and j.finished is not None and now - j.finished > self.ttl_s]:
+            del self._jobs[job_id]
+        # Hard cap in case clients never poll: drop the oldest finished jobs first
+        while len(self._jobs) > self.max_jobs:
+            finished = next((j.id for j in self._jobs.values() if not j.is_active()), None)
+            if finished is None:
+                break
+            del self._jobs[finished]
+
+
+JOBS = JobRegistry(
+    max_active=CONFIG.MAX_ACTIVE_JOBS,
+    ttl_s=CONFIG.JOB_TTL_S,
+    max_jobs=CONFIG.MAX_TRACKED_JOBS
+)
+
+def _apply_settings(settings):
+    """Job limits follow config reloads."""
+    JOBS.max_active = settings.MAX_ACTIVE_JOBS
+    JOBS.ttl_s = settings.JOB_TTL_S
+    JOBS.max_jobs = settings.MAX_TRACKED_JOBS
+
+CONFIG.subscribe(_apply_settings)
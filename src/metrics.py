@@ -0,0 +1,134 @@
+"""
+In-process tracing spans, histograms and counters, exported in Prometheus text format.
+Recording is a lock and a bisect per observation, cheap enough for the hot path.
+Metrics live in the API process; worker-side stages are timed from the pool's side.
+
+Span names: usb_hub_reset, driver_reload, port_resolution, warmup, capture,
+validation, queue_wait, inference, result_transfer, stage, response_build, pipeline.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond validity checks up to multi-second resets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: dict(s, counts=list(s["counts"])) for key, s in self._series.items()}
+        for key, s in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, s["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {s['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {s['sum']:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {s['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get(name, lambda: Histogram(name, help_text, buckets))
+
+    def counter(self, name, help_text):
+        return self._get(name, lambda: Counter(name, help_text))
+
+    def _get(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Registry()
+
+SPANS = METRICS.histogram("hawk_span_seconds", "Duration of traced pipeline steps")
+RETRIES = METRICS.counter("hawk_retries_total", "Automatic part retries started")
+RESETS = METRICS.counter("hawk_hardware_resets_total", "Camera recovery steps by level")
+VERDICTS = METRICS.counter("hawk_verdicts_total", "Pipeline verdicts by result")
+FAILURES = METRICS.counter("hawk_failures_total", "Failed pipeline runs (by first failing stage) and captures")
+INVALID_FRAMES = METRICS.counter("hawk_invalid_frames_total", "Rejected frames by camera and validator reason")
+
+
+def observe(name, seconds, **labels):
+    """Records a span measured elsewhere."""
+    SPANS.observe(seconds, span=name, **labels)
+
+@contextmanager
+def span(name, **labels):
+    """Times the block as a named span; the duration is recorded even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPANS.observe(time.perf_counter() - start, span=name, **labels)
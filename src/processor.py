@@ -1,11 +1,22 @@
+import time
 import concurrent.futures
-from vision_logo import check_nic_logos, check_nic_position
+from config_loader import CONFIG
+from worker_pool import get_pool
+from batcher import get_batcher
+from frame_store import STORE
+from artwork_cache import ARTWORK, ArtworkMissing
+from metrics import span, observe, VERDICTS, FAILURES
+from station import STATION
+from vision_logo import check_nic_layout
 from vision_qr import validate_qr_code
 from vision_ocr import perform_meter_ocr
 
-def _build_response(cmd_code, success=False, logos=True, pos=True, n_qr=True, m_qr=True, ocr=True, reason="", data=None):
-    """Consistent response schema for handshake."""
-    return {
+def _build_response(cmd_code, success=False, logos=True, pos=True, n_qr=True, m_qr=True, ocr=True, reason="", data=None, cameras=None):
+    """
+    Consistent response schema for handshake. Stations other than the two-camera
+    preset add "cameras": per-camera stage results.
+    """
+    response = {
         "header": {"cmdCode": cmd_code},
         "data": {
             "success": success,
@@ -19,54 +30,272 @@ def _build_response(cmd_code, success=False, logos=True, pos=True, n_qr=True, m_
             "original_data": data
         }
     }
+    if cameras is not None:
+        response["data"]["cameras"] = cameras
+    return response
+
+# --- Stage table ---
+# Each stage reads the result of one worker task and returns (passed, reason).
+# The order of STAGES is the decision order of the pipeline.
+
+def _eval_logos(res):
+    res = res["logos"]
+    return res.get("status") == "PASS", f"Logo: {res.get('error')}"
+
+def _eval_positions(res):
+    res = res["positions"]
+    return res.get("status") == "PASS", f"Position: {res.get('error')}"
+
+def _eval_ocr(res):
+    return res.get("status") == "PASS", f"OCR: {res.get('error')}"
+
+def _eval_qr(camera):
+    return lambda res: (not res.get("error") and bool(res.get("codes")), f"{camera} QR unreadable")
+
+def _eval_qr_position(camera):
+    return lambda res: (not res.get("error") and bool(res.get("codes")) and bool(res.get("position_ok")), f"{camera} QR invalid/out of bounds")
+
+def _with_reason(evaluate, reason):
+    return lambda res: (evaluate(res)[0], reason)
+
+# The two-camera preset keeps its original response: stage aliases, _build_response flags and reasons
+PRESET_NAMES = {"nic_logos": "niclogos"}
+PRESET_FLAGS = {"niclogos": "logos", "nic_positions": "pos", "nic_qr": "n_qr", "meter_qr": "m_qr", "meter_ocr": "ocr"}
+PRESET_REASONS = {"nic_qr": "NIC QR unreadable", "meter_qr": "Meter QR invalid/out of bounds"}
+
+def _check_stages(camera, check):
+    """(task name, [(stage name, evaluator)]) of one check on one camera."""
+    if check == "layout":
+        return f"{camera}_layout", [(f"{camera}_logos", _eval_logos), (f"{camera}_positions", _eval_positions)]
+    if check == "qr":
+        return f"{camera}_qr", [(f"{camera}_qr", _eval_qr(camera))]
+    if check == "qr_position":
+        return f"{camera}_qr", [(f"{camera}_qr", _eval_qr_position(camera))]
+    return f"{camera}_ocr", [(f"{camera}_ocr", _eval_ocr)]
+
+def _preset_stage(name, evaluate):
+    """A stage under its preset alias, with the preset's reason text."""
+    if name in PRESET_REASONS:
+        evaluate = _with_reason(evaluate, PRESET_REASONS[name])
+    name = PRESET_NAMES.get(name, name)
+    return name, evaluate, PRESET_FLAGS.get(name)
 
-def process_images(meter_img, nic_img, data):
+def build_stage_table(station):
     """
-    Parallel validation pipeline. Executes YOLO, QR, and OCR checks 
-    concurrently to minimize cycle time on the production line.
+    STAGES as (stage name, task name, evaluator, _build_response flag or None), plus
+    {task: camera} and {task: check}, for every check of every camera of a station.
+    """
+    stages, task_cameras, task_checks = [], {}, {}
+    for camera in station.cameras:
+        for check in camera.checks:
+            task, checks = _check_stages(camera.name, check)
+            task_cameras[task] = camera.name
+            task_checks[task] = check
+            for name, evaluate in checks:
+                name, evaluate, flag = _preset_stage(name, evaluate) if station.preset else (name, evaluate, None)
+                stages.append((name, task, evaluate, flag))
+    return tuple(stages), task_cameras, task_checks
+
+# For the preset: niclogos, nic_positions, nic_qr, meter_qr, meter_ocr
+STAGES, TASK_CAMERAS, TASK_CHECKS = build_stage_table(STATION)
+
+def task_call(task, frames, artwork):
+    """(function, args, kwargs) of a worker task on frames ({camera: frame or handle})."""
+    camera, check = TASK_CAMERAS[task], TASK_CHECKS[task]
+    frame = frames[camera]
+    if check == "layout":
+        return check_nic_layout, (frame, artwork), {"roi_stage": f"{camera}_logos"}
+    if check == "qr":
+        return validate_qr_code, (frame,), {"roi_stage": f"{camera}_qr", "artwork_id": artwork}
+    if check == "qr_position":
+        return validate_qr_code, (frame,), {"check_limits": True, "roi_stage": f"{camera}_qr", "artwork_id": artwork}
+    return perform_meter_ocr, (frame, artwork), {"roi_stage": f"{camera}_ocr"}
+
+def _submit_tasks(pool, handles, artwork, tasks):
+    """
+    Submits the requested worker tasks at once; handles maps camera to its frame handle.
+    Logo presence and position share one YOLO pass. With micro-batching on, calls to
+    the same model (e.g. the QR checks of several cameras) may share a worker job.
+    """
+    batcher = get_batcher()
+    submit = batcher.submit if batcher is not None else pool.submit
+    futures = {}
+    for task in tasks:
+        fn, args, kwargs = task_call(task, handles, artwork)
+        futures[task] = submit(fn, *args, **kwargs)
+    return futures
+
+def stages_to_retry(outcomes):
+    """Stages that did not pass: failed ones and ones never decided (cancelled or errored)."""
+    return [name for name, _, _, _ in STAGES if not (outcomes.get(name) or {}).get("passed")]
+
+def cameras_for(stages):
+    """Cameras whose frames the given stages read."""
+    tasks = {task for name, task, _, _ in STAGES if name in stages}
+    return tuple(camera for camera in STATION.names() if camera in {TASK_CAMERAS[t] for t in tasks})
+
+def _first_failure(outcomes):
+    """Earliest stage in decision order that has completed and failed."""
+    for name, _, _, _ in STAGES:
+        outcome = outcomes.get(name)
+        if outcome is not None and not outcome["passed"]:
+            return name
+    return None
+
+def _decisive_failure(outcomes, expected):
+    """
+    Failing stage that already decides the part: every stage of expected before it in
+    decision order has been decided, so later results can no longer change the verdict.
+    """
+    for name, _, _, _ in STAGES:
+        if name not in expected:
+            continue
+        outcome = outcomes.get(name)
+        if outcome is None:
+            return None
+        if not outcome["passed"]:
+            return name
+    return None
+
+def camera_results(outcomes):
+    """{camera: {stage: passed}} for the decided stages; None for stages never decided."""
+    cameras = {camera: {} for camera in STATION.names()}
+    for name, task, _, _ in STAGES:
+        outcome = outcomes.get(name)
+        cameras[TASK_CAMERAS[task]][name] = None if outcome is None else outcome["passed"]
+    return cameras
+
+def _verdict(cmd_code, outcomes, data):
+    cameras = None if STATION.preset else camera_results(outcomes)
+    failed = _first_failure(outcomes)
+    if failed is None:
+        return _build_response(cmd_code, success=True, data=data, cameras=cameras)
+    flag = next(f for name, _, _, f in STAGES if name == failed)
+    flags = {flag: False} if flag else {}
+    return _build_response(cmd_code, reason=outcomes[failed]["reason"], data=data, cameras=cameras, **flags)
+
+def _schedule(futures, timeout, collect_all, on_event=None, outcomes=None):
+    """
+    Evaluates stages as their tasks complete. In fail-fast mode a failure decides
+    the part once every stage before it in decision order is decided, so the
+    verdict does not depend on completion order; the remaining tasks are then
+    cancelled (queued) or abandoned (already running). With collect_all every
+    task is awaited.
+    on_event, if given, is called as on_event(name, **payload) per decided stage.
+    outcomes may carry stages already decided by an earlier run.
+    Returns (outcomes, timings, error).
+    """
+    task_of = {f: task for task, f in futures.items()}
+    outcomes = dict(outcomes or {})
+    timings = {}
+    error = None
+    start = time.monotonic()
+    deadline = start + timeout
+    pending = set(futures.values())
+    expected = set(outcomes) | {name for name, task, _, _ in STAGES if task in futures}
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        done, pending = concurrent.futures.wait(pending, timeout=max(remaining, 0), return_when=concurrent.futures.FIRST_COMPLETED)
+        if not done:
+            error = error or f"{len(pending)} checks exceeded {timeout}s"
+            break
+
+        for future in done:
+            task = task_of[future]
+            timings[task] = time.monotonic() - start
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or f"{task}: {e}"
+                continue
+            for name, stage_task, evaluate, _ in STAGES:
+                if stage_task == task:
+                    passed, reason = evaluate(result)
+                    outcomes[name] = {"passed": passed, "reason": "" if passed else reason}
+                    if on_event:
+                        on_event("stage", stage=name, **outcomes[name])
+
+        if not collect_all and (error or _decisive_failure(outcomes, expected)):
+            break
+
+    for future in pending:
+        future.cancel()
+    return outcomes, timings, error
+
+def run_pipeline(frames, data, collect_all=None, on_event=None, stages=None, prior=None):
+    """
+    Runs the vision stages over frames ({camera: frame}) and returns a dict with the handshake "response",
+    the per-stage "outcomes" that were decided, task "timings" in seconds and
+    any engine "error". on_event receives stage-level events as they happen.
+
+    stages limits the run to a subset of stage names (e.g. from stages_to_retry);
+    the passing outcomes in prior are kept and merged into the verdict, so the
+    frame of a camera with no stage to run may be None or missing.
     """
     cmd_code = data["header"]["cmdCode"]
     #Ideal Artwork file is saved by another software into a specific location, to ensure correct artwork file is loaded for comparison
     artwork = data["data"].get("idealArtworkPath")
-    imgs = (meter_img, nic_img)
-
-    # ProcessPoolExecutor since these are heavy tasks
-    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as pool:
-        # Submit all tasks simultaneously
-        future_logos = pool.submit(check_nic_logos, nic_img, artwork)
-        future_pos = pool.submit(check_nic_position, nic_img, artwork)
-        future_nqr = pool.submit(validate_qr_code, nic_img)
-        future_mqr = pool.submit(validate_qr_code, meter_img, check_limits=True)
-        future_ocr = pool.submit(perform_meter_ocr, meter_img)
-
-        try:
-            logo_res = future_logos.result()
-            pos_res = future_pos.result()
-            nqr_res = future_nqr.result()
-            mqr_res = future_mqr.result()
-            ocr_res = future_ocr.result()
-        except Exception as e:
-            return _build_response(cmd_code, success=False, reason=f"Inference Engine Error: {str(e)}", data=data)
-    
-    # 1. Logo Check
-    if logo_res.get("status") != "PASS":
-        return _build_response(cmd_code, logos=False, reason=f"Logo: {logo_res.get('error')}", data=data)
-
-    # 2. Position Check
-    if pos_res.get("status") != "PASS":
-        return _build_response(cmd_code, pos=False, reason=f"Position: {pos_res.get('error')}", data=data)
-
-    # 3. NIC QR Check
-    if nqr_res.get("error") or not nqr_res.get("codes"):
-        return _build_response(cmd_code, n_qr=False, reason="NIC QR unreadable", data=data)
-
-    # 4. Meter QR Check
-    if mqr_res.get("error") or not mqr_res.get("codes") or not mqr_res.get("position_ok"):
-        return _build_response(cmd_code, m_qr=False, reason="Meter QR invalid/out of bounds", data=data)
-
-    # 5. OCR Check
-    if ocr_res.get("status") != "PASS":
-        return _build_response(cmd_code, ocr=False, reason=f"OCR: {ocr_res.get('error')}", data=data)
-
-    # All checks passed
-    return _build_response(cmd_code, success=True, data=data)
+    timeout = CONFIG.PIPELINE_TIMEOUT
+    if collect_all is None:
+        collect_all = CONFIG.PIPELINE_COLLECT_ALL
+
+    # Long-lived process pool since these are heavy tasks; models are already loaded in each worker.
+    # Frames go through shared memory once, workers only receive handles
+    stages = [name for name, _, _, _ in STAGES] if stages is None else list(stages)
+    tasks = [task for task in TASK_CAMERAS if any(t == task and name in stages for name, t, _, _ in STAGES)]
+    cameras = [camera for camera in STATION.names() if any(TASK_CAMERAS[t] == camera for t in tasks)]
+    kept = {name: outcome for name, outcome in (prior or {}).items() if outcome["passed"] and name not in stages}
+
+    pool = get_pool()
+    if not pool.is_ready():
+        # Parts captured while the models were still loading wait for them instead of failing
+        pool.wait_ready(CONFIG.WORKER_WARMUP_TIMEOUT)
+    start = time.perf_counter()
+    missing = None
+    try:
+        # Workers get the cached, pre-parsed artwork spec instead of re-reading the sidecar per part
+        artwork_spec = ARTWORK.get(artwork)
+        with STORE.lease(*(frames.get(c) for c in cameras)) as handles:
+            futures = _submit_tasks(pool, dict(zip(cameras, handles)), artwork_spec, tasks)
+            outcomes, timings, error = _schedule(futures, timeout, collect_all, on_event, outcomes=kept)
+    except ArtworkMissing as e:
+        outcomes, timings, error, missing = kept, {}, None, str(e)
+    except Exception as e:
+        outcomes, timings, error = kept, {}, str(e)
+    observe("pipeline", time.perf_counter() - start, retry=str(prior is not None).lower())
+
+    for task, seconds in timings.items():
+        observe("stage", seconds, stage=task)
+
+    with span("response_build"):
+        if error:
+            response = _build_response(cmd_code, success=False, reason=f"Inference Engine Error: {error}", data=data,
+                                       cameras=None if STATION.preset else camera_results(outcomes))
+        elif missing:
+            response = _build_response(cmd_code, success=False, reason=missing, data=data,
+                                       cameras=None if STATION.preset else camera_results(outcomes))
+        else:
+            response = _verdict(cmd_code, outcomes, data)
+
+    # Failure reasons are counted by stage name; the reason text itself is unbounded
+    if error:
+        VERDICTS.inc(result="error")
+        FAILURES.inc(reason="engine_error")
+    elif missing:
+        VERDICTS.inc(result="fail")
+        FAILURES.inc(reason="artwork_missing")
+    elif response["data"]["success"]:
+        VERDICTS.inc(result="pass")
+    else:
+        VERDICTS.inc(result="fail")
+        FAILURES.inc(reason=_first_failure(outcomes))
+    return {"response": response, "outcomes": outcomes, "timings": timings, "error": error}
+
+def process_images(meter_img, nic_img, data, on_event=None):
+    """
+    Parallel validation pipeline. Executes YOLO, QR, and OCR checks 
+    concurrently to minimize cycle time on the production line.
+    A failing check returns the verdict without waiting for slower checks.
+    """
+    return run_pipeline({"meter": meter_img, "nic": nic_img}, data, on_event=on_event)["response"]
@@ -0,0 +1,248 @@
+"""
+Offline replay / batch mode.
+Streams saved meter/NIC image pairs (or one image per camera of the configured
+station) through the same vision stages as the live line and writes per-part
+verdicts and per-stage timings to JSONL or CSV.
+
+Usage (from src/):
+    python replay.py --meter-dir M --nic-dir N --artwork A.png --out results.jsonl
+    python replay.py --manifest parts.csv --workers 4 --max-in-flight 8 --out results.csv
+
+    python replay.py --archive ~/.local/share/Hawk/archive --failed-only --out results.jsonl
+
+Directory mode pairs files by name stem. A manifest is CSV (header) or JSONL
+with one field per camera (meter, nic for the two-camera preset) and optionally
+artwork and part_id. Archive mode
+reads the audit archive index written by archive.py; its results add the
+verdict recorded on the line and whether the replayed one changed.
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+# --config names the settings file; it has to be set before config_loader loads it at import
+if __name__ == "__main__" and "--config" in sys.argv[:-1]:
+    os.environ["HAWK_CONFIG"] = sys.argv[sys.argv.index("--config") + 1]
+
+from worker_pool import get_pool
+from processor import run_pipeline, STAGES, TASK_CAMERAS
+from station import STATION
+from frame_store import with_scale
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".npy")
+# Frame path columns of a result record; the preset keeps its original column order
+FRAME_FIELDS = ("meter", "nic") if STATION.preset else STATION.names()
+
+
+def _stems(directory):
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            files[stem] = os.path.join(directory, name)
+    return files
+
+def parts_from_dirs(meter_dir, nic_dir, artwork=None):
+    """Pairs meter and NIC images with the same file stem."""
+    meters, nics = _stems(meter_dir), _stems(nic_dir)
+    missing = sorted(set(meters) ^ set(nics))
+    if missing:
+        print(f"Replay: skipping {len(missing)} unpaired images", file=sys.stderr)
+    for stem in sorted(set(meters) & set(nics)):
+        yield {"part_id": stem, "frames": {"meter": meters[stem], "nic": nics[stem]}, "artwork": artwork}
+
+def parts_from_manifest(path, artwork=None):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for i, row in enumerate(rows):
+            part = {
+                "part_id": row.get("part_id") or str(i),
+                "frames": {camera: os.path.join(base, row[camera]) for camera in STATION.names()},
+                "artwork": row.get("artwork") or artwork,
+            }
+            yield part
+
+def parts_from_archive(root, artwork=None, failed_only=False):
+    """Parts recorded by the audit archive; retries that re-captured only some cameras are skipped."""
+    from archive import read_index
+    skipped = 0
+    for row in read_index(root, failed_only=failed_only):
+        if not all(row["frames"].get(camera) for camera in STATION.names()):
+            skipped += 1
+            continue
+        yield {
+            "part_id": f"{row['job_id'] or 'part'}-{row['id']}",
+            "frames": row["frames"],
+            "scales": row["scales"],
+            "artwork": row["artwork"] or artwork,
+            "recorded_success": None if row["success"] is None else bool(row["success"]),
+        }
+    if skipped:
+        print(f"Replay: skipping {skipped} archived records without every camera's frame", file=sys.stderr)
+
+def load_image(path):
+    """Reads a saved frame; .npy keeps raw captures bit-exact."""
+    if path.endswith(".npy"):
+        import numpy as np
+        return np.load(path)
+    return cv2.imread(path)
+
+def load_frames(part):
+    """Reads a part's frames, tagged with the scale the archive recorded for reduced ones."""
+    scales = part.get("scales") or {}
+    return {camera: with_scale(load_image(path), scales.get(camera, 1)) for camera, path in part["frames"].items()}
+
+def replay_part(part, collect_all):
+    """Runs one saved part through the pipeline and returns its result record."""
+    start = time.monotonic()
+    frames = load_frames(part)
+    load_ms = (time.monotonic() - start) * 1000
+
+    data = {"header": {"cmdCode": 3}, "data": {"idealArtworkPath": part.get("artwork")}}
+    if any(frame is None for frame in frames.values()):
+        result = {"response": {"data": {"success": False, "reason": "Unreadable image"}}, "outcomes": {}, "timings": {}, "error": "Unreadable image"}
+    else:
+        result = run_pipeline(frames, data, collect_all=collect_all)
+
+    verdict = result["response"]["data"]
+    # Parts from the archive carry the verdict given on the line; changed flags a different outcome now
+    recorded = part.get("recorded_success")
+    record = {"part_id": part["part_id"]}
+    record.update(part["frames"])
+    record.update({
+        "artwork": part.get("artwork"),
+        "success": verdict.get("success"),
+        "reason": verdict.get("reason"),
+        "error": result["error"],
+        "recorded_success": recorded,
+        "changed": None if recorded is None else bool(verdict.get("success")) != recorded,
+        "load_ms": round(load_ms, 1),
+        "total_ms": round((time.monotonic() - start) * 1000, 1),
+    })
+    for name, _, _, _ in STAGES:
+        outcome = result["outcomes"].get(name)
+        record[name] = None if outcome is None else outcome["passed"]
+    for task, seconds in result["timings"].items():
+        record[f"{task}_ms"] = round(seconds * 1000, 1)
+    return record
+
+
+class ResultWriter:
+    """Writes records as JSONL, or CSV when the path ends in .csv."""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.endswith(".csv")
+        self._file = open(path, "w", newline="") if path != "-" else sys.stdout
+        self._csv = None
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            if not self.is_csv:
+                self._file.write(json.dumps(record) + "\n")
+                return
+            if self._csv is None:
+                fields = ["part_id", *FRAME_FIELDS, "artwork", "success", "reason", "error", "recorded_success", "changed", "load_ms", "total_ms"]
+                fields += [name for name, _, _, _ in STAGES]
+                fields += [f"{task}_ms" for task in TASK_CAMERAS]
+                self._csv = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+                self._csv.writeheader()
+            self._csv.writerow(record)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def run_replay(parts, out_path, workers=None, max_in_flight=8, collect_all=False):
+    """
+    Replays parts with at most max_in_flight parts loaded or processing at once.
+    Returns a summary dict with counts and throughput.
+    """
+    pool = get_pool(**({"max_workers": workers} if workers else {}))
+    pool.start(wait=True)
+    if not pool.is_ready():
+        raise RuntimeError(f"Inference pool failed to start: {pool.last_error}")
+
+    writer = ResultWriter(out_path)
+    slots = threading.BoundedSemaphore(max_in_flight)
+    counts = {"parts": 0, "passed": 0, "failed": 0, "errors": 0, "recorded": 0, "changed": 0}
+    counts_lock = threading.Lock()
+
+    def done(future):
+        slots.release()
+        try:
+            record = future.result()
+        except Exception as e:
+            record = {"part_id": None, "success": False, "error": str(e)}
+        writer.write(record)
+        with counts_lock:
+            counts["parts"] += 1
+            if record.get("recorded_success") is not None:
+                counts["recorded"] += 1
+                counts["changed"] += bool(record.get("changed"))
+            if record.get("error"):
+                counts["errors"] += 1
+            elif record.get("success"):
+                counts["passed"] += 1
+            else:
+                counts["failed"] += 1
+
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for part in parts:
+                # Bounded in-flight queue: wait for a slot before loading the next part
+                slots.acquire()
+                executor.submit(replay_part, part, collect_all).add_done_callback(done)
+    finally:
+        writer.close()
+        pool.shutdown()
+
+    elapsed = time.monotonic() - start
+    counts["seconds"] = round(elapsed, 2)
+    counts["parts_per_s"] = round(counts["parts"] / elapsed, 2) if elapsed > 0 else 0.0
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay saved meter/NIC images through the vision pipeline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--meter-dir", help="Directory of meter images (paired with --nic-dir by file stem)")
+    source.add_argument("--manifest", help="CSV or JSONL manifest with a path per camera (meter, nic)[, artwork, part_id]")
+    source.add_argument("--archive", help="Audit archive directory (ARCHIVE_DIR)")
+    parser.add_argument("--nic-dir", help="Directory of NIC images")
+    parser.add_argument("--artwork", help="Artwork path used when a part does not name one")
+    parser.add_argument("--out", default="-", help="Output .jsonl or .csv file (default: JSONL to stdout)")
+    parser.add_argument("--workers", type=int, help="Inference worker processes (default: INFERENCE_WORKERS)")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Parts loaded or processing at once")
+    parser.add_argument("--collect-all", action="store_true", help="Run every stage even after a failure")
+    parser.add_argument("--config", help="Settings file (default: HAWK_CONFIG or ~/.config/Hawk/hawk_settings.conf)")
+    parser.add_argument("--failed-only", action="store_true", help="With --archive, replay only parts that failed")
+    args = parser.parse_args(argv)
+
+    if args.meter_dir:
+        if not args.nic_dir:
+            parser.error("--meter-dir requires --nic-dir")
+        parts = parts_from_dirs(args.meter_dir, args.nic_dir, args.artwork)
+    elif args.archive:
+        parts = parts_from_archive(os.path.expanduser(args.archive), args.artwork, args.failed_only)
+    else:
+        parts = parts_from_manifest(args.manifest, args.artwork)
+
+    summary = run_replay(parts, args.out, args.workers, args.max_in_flight, args.collect_all)
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+CPU budget for the service's roles.
+Splits the cores the service may use between capture threads (reserved, so USB
+reads never wait for inference), the API process and the inference workers,
+and caps the intra-op thread pools (OpenMP, MKL, OpenBLAS, torch, Paddle, OpenCV)
+of each worker so their sum matches the cores they own.
+
+Cores come from CAPTURE_CORES / API_CORES / WORKER_CORES (e.g. 0, 2,3 or 2-7);
+unset roles are planned automatically. CPU_PLAN=off leaves everything unpinned.
+"""
+
+import os
+import sys
+import time
+import threading
+import cv2
+from config_loader import CONFIG
+
+# Environment variables read by the numeric libraries when they initialize
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "CPU_NUM")
+
+
+def parse_cores(value):
+    """Parses 3, [2, 3], "2-5" or ["0", "2-3"] into a sorted list of core ids; None when unset."""
+    if value is None or value == "" or value == "auto":
+        return None
+    items = value if isinstance(value, list) else [value]
+    cores = set()
+    for item in items:
+        item = str(item).strip()
+        if "-" in item:
+            low, high = item.split("-", 1)
+            cores.update(range(int(low), int(high) + 1))
+        elif item:
+            cores.add(int(float(item)))
+    return sorted(cores)
+
+def available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class CpuPlan:
+    def __init__(self, workers, cores=None, capture=None, api=None, inference=None, worker_threads=None, enabled=True):
+        self.enabled = enabled
+        self.workers = max(int(workers), 1)
+        cores = list(cores or available_cores())
+
+        if capture is None:
+            # One core for capture once there are enough to go around
+            capture = cores[:1] if len(cores) >= 4 else []
+        rest = [c for c in cores if c not in capture]
+        if api is None:
+            api = rest[:1] if len(rest) >= 3 else list(rest)
+        if inference is None:
+            inference = [c for c in rest if c not in api] or list(rest)
+
+        self.cores = {"capture": list(capture), "api": list(api), "inference": list(inference)}
+        # Intra-op threads per worker: the inference cores shared out, at least one each
+        self.worker_threads = int(worker_threads) if worker_threads else max(len(inference) // self.workers, 1)
+        self.api_threads = CONFIG.API_THREADS
+
+    def describe(self):
+        return {
+            "enabled": self.enabled,
+            "cores": self.cores,
+            "workers": self.workers,
+            "worker_threads": self.worker_threads,
+            "api_threads": self.api_threads
+        }
+
+    def pin(self, role):
+        """Pins the calling thread (and threads it starts later) to the role's cores."""
+        cores = self.cores.get(role)
+        if not self.enabled or not cores:
+            return
+        try:
+            os.sched_setaffinity(0, cores)
+        except (AttributeError, OSError) as e:
+            print(f"CPU Pinning Error ({role}): {e}")
+
+    def apply_api(self):
+        """Pins the API process and sizes OpenCV's own pool to its cores."""
+        if not self.enabled:
+            return
+        self.pin("api")
+        cv2.setNumThreads(max(len(self.cores["api"]), 1))
+
+    def apply_worker(self):
+        """
+        Runs in an inference worker before any framework is imported: pins it to
+        the inference cores and caps every intra-op thread pool.
+        """
+        if not self.enabled:
+            return
+        self.pin("inference")
+        threads = str(self.worker_threads)
+        for name in THREAD_ENV:
+            os.environ[name] = threads
+        cv2.setNumThreads(self.worker_threads)
+        # Frameworks already imported (e.g. by a forked parent) are capped directly
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(self.worker_threads)
+
+
+def _cpu_seconds(pid, tid=None):
+    path = f"/proc/{pid}/task/{tid}/stat" if tid else f"/proc/{pid}/stat"
+    try:
+        with open(path, "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of stat (11 and 12 after the comm field)
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _status_field(pid, name):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(name + ":"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return None
+
+def _thread_names(pid):
+    names = {}
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/comm", "r") as f:
+                names[tid] = f.read().strip()
+    except OSError:
+        pass
+    return names
+
+def cpu_usage(processes, interval=1.0):
+    """
+    Samples CPU usage of {label: pid} over interval seconds. Reports percent of one
+    core per process, allowed cores, thread count and the busiest threads.
+    """
+    before = {}
+    for label, pid in processes.items():
+        before[label] = (_cpu_seconds(pid), {tid: _cpu_seconds(pid, tid) for tid in _thread_names(pid)})
+    time.sleep(interval)
+
+    report = {}
+    for label, pid in processes.items():
+        total_before, threads_before = before[label]
+        total_after = _cpu_seconds(pid)
+        if total_before is None or total_after is None:
+            report[label] = {"pid": pid, "alive": False}
+            continue
+        names = _thread_names(pid)
+        threads = []
+        for tid, name in names.items():
+            start, end = threads_before.get(tid), _cpu_seconds(pid, tid)
+            if start is not None and end is not None and end > start:
+                threads.append({"tid": int(tid), "name": name, "cpu_pct": round((end - start) / interval * 100, 1)})
+        report[label] = {
+            "pid": pid,
+            "alive": True,
+            "cpu_pct": round((total_after - total_before) / interval * 100, 1),
+            "allowed_cores": _status_field(pid, "Cpus_allowed_list"),
+            "threads": int(_status_field(pid, "Threads") or 0),
+            "busiest_threads": sorted(threads, key=lambda t: t["cpu_pct"], reverse=True)[:5]
+        }
+    return report
+
+
+_plan = None
+_plan_lock = threading.Lock()
+
+def get_plan():
+    """Process-wide CPU plan, built from hawk_settings.conf on first use."""
+    global _plan
+    with _plan_lock:
+        if _plan is None:
+            _plan = CpuPlan(
+                workers=CONFIG.INFERENCE_WORKERS,
+                capture=parse_cores(CONFIG.CAPTURE_CORES),
+                api=parse_cores(CONFIG.API_CORES),
+                inference=parse_cores(CONFIG.WORKER_CORES),
+                worker_threads=CONFIG.WORKER_THREADS,
+                enabled=CONFIG.CPU_PLAN != "off"
+            )
+        return _plan
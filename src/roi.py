@@ -0,0 +1,143 @@
+"""
+Region-of-interest helpers for the vision stages.
+Crop windows are derived per stage from the limits files and the artwork
+template's regions. Models run on a padded crop first and fall back to the full
+frame when nothing is found; detections are mapped back to full-frame
+coordinates so the existing position checks keep working.
+
+Stage names: "nic_logos", "nic_qr", "meter_qr", "meter_ocr".
+Windows are [x_min, y_min, x_max, y_max] in full-frame pixels.
+"""
+
+import os
+import json
+from config_loader import CONFIG
+
+
+def artwork_regions(artwork):
+    """
+    Per-stage regions of the artwork template: taken from a cached artwork spec
+    (artwork_cache), or read from the <artwork>.json sidecar of a plain path.
+    Returns {} when there is none.
+    """
+    if not artwork:
+        return {}
+    if isinstance(artwork, dict):
+        return artwork.get("regions") or {}
+    sidecar = os.path.splitext(artwork)[0] + ".json"
+    try:
+        with open(sidecar, "r") as f:
+            return json.load(f).get("regions", {})
+    except (OSError, ValueError):
+        return {}
+
+def _label_window(limits):
+    """Union of the per-label x_range/y_range windows of a YOLO limits file."""
+    xs, ys = [], []
+    y_bounded = True
+    for limit in limits.values():
+        if not isinstance(limit, dict) or "x_range" not in limit:
+            continue
+        xs.extend(limit["x_range"])
+        if "y_range" in limit:
+            ys.extend(limit["y_range"])
+        else:
+            y_bounded = False
+    if not xs:
+        return None
+    # Position limits bound the box's x_min only, so allow for the label width
+    width = CONFIG.ROI_LABEL_MARGIN
+    y_window = [min(ys), max(ys) + width] if ys and y_bounded else [0, None]
+    return [min(xs), y_window[0], max(xs) + width, y_window[1]]
+
+_BOX_KEYS = ("x_min", "y_min", "x_max", "y_max")
+
+def qr_bounds(limits, stage):
+    """
+    QR position bounds of one stage: qr_limits[stage], or the flat qr_limits box,
+    which is the meter QR bound and so only applies to meter_qr. None if neither.
+    """
+    qr = (limits or {}).get("qr_limits") or {}
+    if isinstance(qr.get(stage), dict):
+        qr = qr[stage]
+    elif stage != "meter_qr":
+        return None
+    return qr if all(k in qr for k in _BOX_KEYS) else None
+
+def stage_window(stage, limits=None, regions=None):
+    """
+    Window for a stage, in priority order: the artwork template region, an
+    explicit "roi" in the limits file, then one derived from the limits.
+    "roi" is either one window for every stage of the file or {stage: window}.
+    Returns None when nothing describes where this stage's feature is.
+    """
+    if not CONFIG.ROI_ENABLED:
+        return None
+    if regions and regions.get(stage):
+        return list(regions[stage])
+    limits = limits or {}
+    roi = limits.get("roi")
+    if isinstance(roi, dict):
+        if roi.get(stage):
+            return list(roi[stage])
+    elif roi and not stage.endswith("_qr"):
+        # The QR limits file serves several cameras; its windows must be per stage
+        return list(roi)
+
+    # Stage names are <camera>_logos, <camera>_qr and <camera>_ocr
+    if stage.endswith("_logos"):
+        return _label_window(limits)
+    if stage.endswith("_qr"):
+        qr = qr_bounds(limits, stage)
+        if qr is not None:
+            return [qr[k] for k in _BOX_KEYS]
+    return None
+
+def crop(image, window, pad=None):
+    """
+    Padded crop of a window, clipped to the frame. Returns (view, (x_off, y_off));
+    the view shares memory with the frame.
+    """
+    if pad is None:
+        pad = CONFIG.ROI_PADDING
+    height, width = image.shape[:2]
+    x0, y0, x1, y1 = window
+    x1 = width if x1 is None else x1
+    y1 = height if y1 is None else y1
+
+    x0 = max(int(x0) - pad, 0)
+    y0 = max(int(y0) - pad, 0)
+    x1 = min(int(x1) + pad, width)
+    y1 = min(int(y1) + pad, height)
+    return image[y0:y1, x0:x1], (x0, y0)
+
+def map_bbox(bbox, offset):
+    """Maps an [x_min, y_min, x_max, y_max] box from crop to full-frame coordinates."""
+    x_off, y_off = offset
+    return [bbox[0] + x_off, bbox[1] + y_off, bbox[2] + x_off, bbox[3] + y_off]
+
+def scale_window(window, factor):
+    """A full-resolution window in the pixels of a 1/factor frame."""
+    if window is None or factor == 1:
+        return window
+    return [None if v is None else v / factor for v in window]
+
+def map_poly(poly, offset):
+    x_off, y_off = offset
+    return [[p[0] + x_off, p[1] + y_off] for p in poly]
+
+def run_on_roi(image, window, infer, found):
+    """
+    Runs infer on the padded crop of window, then on the full frame if found(result)
+    is false. Returns (result, offset), where offset maps result coordinates back.
+    """
+    if window is not None:
+        view, offset = crop(image, window)
+        if view.size:
+            try:
+                result = infer(view)
+                if found(result):
+                    return result, offset
+            except RuntimeError:
+                pass
+    return infer(image), (0, 0)
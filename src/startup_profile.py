@@ -0,0 +1,85 @@
+"""
+Import-time profile of the service.
+Runs a fresh interpreter with -X importtime for each target and reports where
+startup time goes: the slowest modules and the total per top-level package.
+
+Usage (from src/):
+    python startup_profile.py                      # app plus the heavy vision frameworks
+    python startup_profile.py app vision_ocr --top 15 --json
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+DEFAULT_TARGETS = ("app", "vision_logo", "vision_ocr", "vision_qr", "paddleocr", "qreader")
+
+
+def profile_import(module):
+    """
+    Imports module in a fresh interpreter. Returns (total_ms, rows) where rows
+    are (module, self_ms, cumulative_ms) as reported by -X importtime.
+    """
+    # Exit right after the import so background work it starts (e.g. the worker pool) is not profiled
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import os, {module}; os._exit(0)"],
+        capture_output=True, universal_newlines=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        rows.append((name.strip(), int(self_us) / 1000.0, int(cumulative_us) / 1000.0))
+        # Forked children inherit -X importtime; stop at the target's own top-level line
+        if name == " " + module:
+            break
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+        return None, rows, error
+    total = next((cumulative for name, _, cumulative in rows if name == module), None)
+    return total, rows, None
+
+def summarize(module, top):
+    total, rows, error = profile_import(module)
+    packages = {}
+    for name, self_ms, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_ms
+    return {
+        "module": module,
+        "total_ms": None if total is None else round(total, 1),
+        "error": error,
+        "slowest_modules": [
+            {"module": name, "self_ms": round(self_ms, 1), "cumulative_ms": round(cumulative, 1)}
+            for name, self_ms, cumulative in sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+        ],
+        "packages_ms": {p: round(ms, 1) for p, ms in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import time per module and package.")
+    parser.add_argument("targets", nargs="*", default=list(DEFAULT_TARGETS))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = [summarize(module, args.top) for module in args.targets]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for entry in report:
+        if entry["error"]:
+            print(f"{entry['module']}: FAILED ({entry['error']})")
+            continue
+        print(f"{entry['module']}: {entry['total_ms']} ms")
+        for package, ms in entry["packages_ms"].items():
+            print(f"    {package:<32} {ms:>9.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Declarative station definition: the cameras of one inspection station and the
+checks run on each camera's frame.
+
+STATION_FILE names a JSON file such as
+    {"cameras": [
+        {"name": "nic", "physical_id": "pci-0000:00:14.0-usb-0:9:1.0", "rotation": 0,
+         "format": "yuyv", "hub_port": 2, "checks": ["layout", "qr"]},
+        {"name": "meter", "physical_id": "pci-0000:00:14.0-usb-0:2:1.0", "rotation": 180,
+         "format": "mjpeg", "checks": ["qr_position", "ocr"]},
+        {"name": "side", "physical_id": "pci-0000:00:14.0-usb-0:3:1.0", "checks": ["qr"]}
+    ]}
+Without one the station is the two-camera preset built from the METER_* / NIC_*
+keys, which keeps today's stage names and response schema.
+
+Camera order is the decision order of the pipeline. "bus" groups cameras that
+share USB bandwidth; it defaults to the host controller part of the physical ID.
+"""
+
+import os
+import re
+import json
+from config_loader import CONFIG
+
+# Check types a camera can run (see processor.py for the task and stages of each)
+CHECKS = ("layout", "qr", "qr_position", "ocr")
+# Checks that work on a reduced decode; layout and QR positions need full-resolution pixels
+REDUCED_OK = ("ocr",)
+FORMATS = ("yuyv", "mjpeg")
+
+# "pci-0000:00:14.0-usb-0:2.3:1.0" -> "pci-0000:00:14.0-usb-0"
+_USB_BUS = re.compile(r"^(.*-usb-\d+)[:.]")
+
+
+class CameraSpec:
+    def __init__(self, name, physical_id, rotation=0, format=None, checks=(), hub_port=None, bus=None):
+        self.name = name
+        self.physical_id = physical_id
+        self.rotation = int(rotation or 0)
+        self.format = (format or ("yuyv" if CONFIG.YUY_MODE else "mjpeg")).lower()
+        self.checks = tuple(checks)
+        self.hub_port = hub_port
+        self.bus = bus or usb_bus(physical_id)
+
+        if self.format not in FORMATS:
+            raise ValueError(f"Camera {name}: unknown format {self.format}")
+        unknown = [c for c in self.checks if c not in CHECKS]
+        if unknown:
+            raise ValueError(f"Camera {name}: unknown checks {unknown}")
+        if "qr" in self.checks and "qr_position" in self.checks:
+            raise ValueError(f"Camera {name}: use either qr or qr_position, not both")
+
+    def decode_scale(self):
+        """MJPEG_DECODE_SCALE when every check of this camera tolerates a reduced decode, else 1."""
+        if self.checks and all(check in REDUCED_OK for check in self.checks):
+            return CONFIG.MJPEG_DECODE_SCALE
+        return 1
+
+    def describe(self):
+        return {
+            "physical_id": self.physical_id,
+            "rotation": self.rotation,
+            "format": self.format,
+            "checks": list(self.checks),
+            "hub_port": self.hub_port,
+            "bus": self.bus
+        }
+
+
+class Station:
+    def __init__(self, cameras, preset=False):
+        self.cameras = list(cameras)
+        self.preset = preset
+        self._by_name = {camera.name: camera for camera in self.cameras}
+        if len(self._by_name) != len(self.cameras):
+            raise ValueError("Camera names must be unique")
+
+    def names(self):
+        return tuple(camera.name for camera in self.cameras)
+
+    def camera(self, name):
+        return self._by_name[name]
+
+    def describe(self):
+        return {"preset": self.preset, "cameras": {camera.name: camera.describe() for camera in self.cameras}}
+
+
+def usb_bus(physical_id):
+    """Host controller part of an ID_PATH; cameras on it share one bus's bandwidth."""
+    match = _USB_BUS.match(physical_id or "")
+    return match.group(1) if match else None
+
+def two_camera_preset():
+    """The original meter + NIC station, in the original stage order (NIC checks first)."""
+    return Station([
+        CameraSpec("nic", CONFIG.NIC_PHYSICAL_ID, CONFIG.NIC_ROTATION,
+                   checks=("layout", "qr"), hub_port=CONFIG.NIC_HUB_PORT),
+        CameraSpec("meter", CONFIG.METER_PHYSICAL_ID, CONFIG.METER_ROTATION,
+                   checks=("qr_position", "ocr"), hub_port=CONFIG.METER_HUB_PORT),
+    ], preset=True)
+
+def load_station(path=None):
+    """Station from a JSON definition, or the two-camera preset when none is configured."""
+    path = path or CONFIG.STATION_FILE
+    if not path:
+        return two_camera_preset()
+    try:
+        with open(os.path.expanduser(path), "r") as f:
+            spec = json.load(f)
+        return Station([CameraSpec(**camera) for camera in spec["cameras"]])
+    except Exception as e:
+        print(f"Station Definition Error ({path}): {e}; using the two-camera preset")
+        return two_camera_preset()
+
+
+# Singleton station shared by capture, health tracking and the pipeline
+STATION = load_station()
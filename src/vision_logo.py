@@ -1,20 +1,36 @@
 """This file contains only sample functions with sample model names and class names."""
 
-import json
 import numpy as np
+from frame_store import load_frame
+from config_loader import LIMITS
+from roi import artwork_regions, stage_window, run_on_roi, map_bbox, crop
+from inference_backend import build_yolo_backend
 
 class DetectionYOLO:
   #model file and limits file will be put at specific path at the time of deployment. Limits file can be edited by technician to adjust tolerance if needed
     def __init__(self, model_path, limits_path):
-        self.limits = self._load_limits(limits_path)
+        self.limits_path = limits_path
+        LIMITS.get(limits_path)
         # In production: self.model = YOLO(model_path)
         self.model = None 
+        # Optimized runtime (e.g. an INT8 ONNX export) when YOLO_BACKEND selects one
+        self.backend = build_yolo_backend()
 
-    def _load_limits(self, path):
-        with open(path, 'r') as f:
-            return json.load(f)
+    @property
+    def limits(self):
+        # Current version of the limits file: edits apply without reloading the model
+        return LIMITS.get(self.limits_path)
 
     def detect_and_process(self, image):
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """Detections for several images; an ONNX backend runs them in one forward pass."""
+        if self.backend is not None:
+            return self.backend.detect(images)
+        return [self._detect_native(image) for image in images]
+
+    def _detect_native(self, image):
         """
         Skeleton for proprietary inference and post-processing.
         1. Runs YOLO inference.
@@ -26,36 +42,81 @@ class DetectionYOLO:
             {"label": "brand_label", "bbox": [510, 55, 590, 95], "conf": 0.95}
         ]
 
-def check_nic_logos(image, artwork_id):
+# Process-wide detector, built once per worker by the inference pool initializer
+_detector = None
+
+def get_detector():
+    """Returns the DetectionYOLO instance of this process, building it on first use."""
+    global _detector
+    if _detector is None:
+        _detector = DetectionYOLO("weights/prod_v1.pt", "config/limits.json")
+    return _detector
+
+def _all_expected(artwork_id):
+    """
+    Whether a region-of-interest pass is enough: every label the limits expect was found in it.
+    Anything missing (e.g. a logo printed outside the window) sends the frame to a full-frame pass.
+    """
+    expected = {label for label, limit in _limits_for(artwork_id).items() if label != "roi" and isinstance(limit, dict)}
+    return lambda detections: bool(detections) and expected <= {d["label"] for d in detections}
+
+def detect_nic_logos(image, artwork_id=None, roi_stage="nic_logos"):
+    """
+    Single YOLO pass over a NIC frame. The result feeds both the count and the position checks.
+    Runs on the expected logo region (of roi_stage) when one is known, and on the full frame when
+    that misses an expected label; bboxes are in full-frame coordinates.
+    """
+    yolo = get_detector()
+    frame = load_frame(image)
+    window = stage_window(roi_stage, yolo.limits, artwork_regions(artwork_id))
+    detections, offset = run_on_roi(frame, window, yolo.detect_and_process, _all_expected(artwork_id))
+    return [dict(d, bbox=map_bbox(d["bbox"], offset)) for d in detections]
+
+def detect_nic_logos_batch(items):
+    """
+    detect_nic_logos for several (image, artwork_id, roi_stage) items, one detector call per pass:
+    all regions of interest first, then the full frames of those missing an expected label.
+    """
+    yolo = get_detector()
+    frames = [load_frame(image) for image, _, _ in items]
+    views = []
+    for frame, (_, artwork_id, roi_stage) in zip(frames, items):
+        window = stage_window(roi_stage, yolo.limits, artwork_regions(artwork_id))
+        view, offset = crop(frame, window) if window is not None else (frame, (0, 0))
+        views.append((view, offset) if view.size else (frame, (0, 0)))
+
+    results = yolo.detect_batch([view for view, _ in views])
+    retry = [i for i, dets in enumerate(results)
+             if views[i][0] is not frames[i] and not _all_expected(items[i][1])(dets)]
+    if retry:
+        for i, dets in zip(retry, yolo.detect_batch([frames[i] for i in retry])):
+            results[i], views[i] = dets, (frames[i], (0, 0))
+    return [[dict(d, bbox=map_bbox(d["bbox"], offset)) for d in dets] for dets, (_, offset) in zip(results, views)]
+
+def evaluate_logo_counts(detections, limits):
     """
     Validates presence and count of required logos.
     Ensures no unauthorized or extra logos are detected on the product.
     """
-    yolo = DetectionYOLO("weights/prod_v1.pt", "config/limits.json")
-    detections = yolo.detect_and_process(image)
-    
     found_counts = {}
     for d in detections:
         lbl = d['label']
         found_counts[lbl] = found_counts.get(lbl, 0) + 1
 
-    # Logic: Compare found_counts against yolo.limits min/max_count
+    # Logic: Compare found_counts against limits min/max_count
     # Logic: Check for 'unexpected' labels not in limits
     
     return {"status": "PASS", "error": None}
 
-def check_nic_position(image, artwork_id):
+def evaluate_logo_positions(detections, limits):
     """
     Spatial Constraint Validator.
     Checks if detected features are within specified X/Y coordinate boundaries.
     """
-    yolo = DetectionYOLO("weights/prod_v1.pt", "config/limits.json")
-    detections = yolo.detect_and_process(image)
-
     for det in detections:
         lbl = det['label']
-        if lbl in yolo.limits:
-            limit = yolo.limits[lbl]
+        if lbl in limits:
+            limit = limits[lbl]
             x_min, y_min, x_max, y_max = det['bbox']
             
             # Boundary Validation Logic
@@ -63,3 +124,41 @@ def check_nic_position(image, artwork_id):
                 return {"status": "FAIL", "error": f"Position mismatch: {lbl}"}
                 
     return {"status": "PASS", "error": None}
+
+def _limits_for(artwork):
+    """Detector limits, with the position windows of a cached artwork spec taking precedence."""
+    limits = get_detector().limits
+    if isinstance(artwork, dict) and artwork.get("position_windows"):
+        limits = dict(limits, **artwork["position_windows"])
+    return limits
+
+def _layout_verdict(detections, artwork_id):
+    limits = _limits_for(artwork_id)
+    return {
+        "logos": evaluate_logo_counts(detections, limits),
+        "positions": evaluate_logo_positions(detections, limits),
+        "detections": detections
+    }
+
+def check_nic_layout(image, artwork_id, roi_stage="nic_logos"):
+    """Runs detection once and returns both the logo and the position verdicts."""
+    return _layout_verdict(detect_nic_logos(image, artwork_id, roi_stage), artwork_id)
+
+def _layout_args(image, artwork_id=None, roi_stage="nic_logos"):
+    return image, artwork_id, roi_stage
+
+def check_nic_layout_batch(calls):
+    """check_nic_layout over several (args, kwargs) calls, sharing detector passes."""
+    items = [_layout_args(*args, **kwargs) for args, kwargs in calls]
+    return [_layout_verdict(dets, artwork_id) for dets, (_, artwork_id, _) in zip(detect_nic_logos_batch(items), items)]
+
+# Used by the micro-batcher (batcher.py) when several layout checks are queued together
+check_nic_layout.batched = check_nic_layout_batch
+
+def check_nic_logos(image, artwork_id):
+    """Standalone logo count check; the pipeline uses check_nic_layout instead."""
+    return evaluate_logo_counts(detect_nic_logos(image, artwork_id), _limits_for(artwork_id))
+
+def check_nic_position(image, artwork_id):
+    """Standalone position check; the pipeline uses check_nic_layout instead."""
+    return evaluate_logo_positions(detect_nic_logos(image, artwork_id), _limits_for(artwork_id))
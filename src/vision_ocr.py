@@ -3,25 +3,34 @@ This file contains sample functions.
 Proprietary text validation logic and serial format matching are abstracted.
 """
 
-import json
-from paddleocr import PaddleOCR
+from frame_store import load_frame, frame_scale
+from config_loader import LIMITS
+from resources import get_plan
+from inference_backend import paddle_options
+from roi import artwork_regions, stage_window, run_on_roi, map_poly, scale_window
 
 
 class OCR:
     def __init__(self, limits_path):
-        self.limits = self._load_limits(limits_path)
+        self.limits_path = limits_path
+        LIMITS.get(limits_path)
+        # Imported here so importing this module stays cheap; the framework loads with the model
+        from paddleocr import PaddleOCR
         self.ocr = PaddleOCR(
             text_recognition_model_name="PP-OCRv5_mobile_rec",
             text_detection_model_name="PP-OCRv5_mobile_det",
             use_textline_orientation=False,
             use_doc_orientation_classify=False,
             use_doc_unwarping=False,
-            device="cpu"
+            device="cpu",
+            cpu_threads=get_plan().worker_threads,
+            **paddle_options()
         )
 
-    def _load_limits(self, path):
-        with open(path, 'r') as f:
-            return json.load(f)
+    @property
+    def limits(self):
+        # Current version of the limits file: edits apply without reloading the model
+        return LIMITS.get(self.limits_path)
 
     def extract_ppocr_boxes(self, page):
         """
@@ -64,15 +73,34 @@ class OCR:
         }
         return self.extract_ppocr_boxes(mock_page)
 
-def perform_meter_ocr(meter_img):
+# Process-wide OCR engine, built once per worker by the inference pool initializer
+_ocr_engine = None
+
+def get_ocr_engine():
+    """Returns the OCR instance of this process, building it on first use."""
+    global _ocr_engine
+    if _ocr_engine is None:
+        _ocr_engine = OCR("config/ocr_limits.json")
+    return _ocr_engine
+
+def perform_meter_ocr(meter_img, artwork_id=None, roi_stage="meter_ocr"):
     """
     In production, this might compare text from multiple images 
     or validate against an expected serial number format.
     """
-    ocr_engine = OCR("config/ocr_limits.json")
+    ocr_engine = get_ocr_engine()
     
-    # Run inference on the provided frame
-    extracted_data = ocr_engine.perform_inference(meter_img)
+    # Run inference on the expected text region, falling back to the full frame
+    # An OCR-only camera may deliver a reduced decode; windows and results stay in full-resolution pixels
+    factor = frame_scale(meter_img)
+    frame = load_frame(meter_img)
+    window = scale_window(stage_window(roi_stage, ocr_engine.limits, artwork_regions(artwork_id)), factor)
+    extracted_data, (x_off, y_off) = run_on_roi(frame, window, ocr_engine.perform_inference, bool)
+    extracted_data = [
+        dict(d, xmin=(d["xmin"] + x_off) * factor, y_center=(d["y_center"] + y_off) * factor,
+             poly=[[x * factor, y * factor] for x, y in map_poly(d["poly"], (x_off, y_off))])
+        for d in extracted_data
+    ]
 
     #Ideal image can also be passed here if we need 1:1 comparison of text
     
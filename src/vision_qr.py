@@ -3,19 +3,37 @@ This file contains only sample functions.
 Utilizes QReader.
 """
 
-import json
 import cv2
-from qreader import QReader 
 import numpy as np
+from frame_store import load_frame
+from config_loader import CONFIG, LIMITS
+from roi import artwork_regions, stage_window, run_on_roi, map_bbox, crop, qr_bounds
+
+def parse_tiers(spec):
+    """Parses QR_TIERS entries like "opencv:0.5" into (engine, scale) pairs."""
+    if isinstance(spec, str):
+        spec = [spec]
+    tiers = []
+    for entry in spec:
+        engine, _, scale = str(entry).partition(":")
+        tiers.append((engine.strip().lower(), float(scale) if scale else 1.0))
+    return tiers
 
 class QRValidator:
     def __init__(self, limits_path):
-        self.limits = self._load_limits(limits_path)
-        self.detector = QReader()
+        self.limits_path = limits_path
+        LIMITS.get(limits_path)
+        # Imported here so importing this module stays cheap; the framework loads with the model
+        from qreader import QReader
+        self.detector = QReader(model_size=CONFIG.QR_MODEL_SIZE)
+        # Cheap first tier; QReader is only used when this fails
+        self.fast_detector = cv2.QRCodeDetector()
+        self.tiers = parse_tiers(CONFIG.QR_TIERS)
 
-    def _load_limits(self, path):
-        with open(path, 'r') as f:
-            return json.load(f)
+    @property
+    def limits(self):
+        # Current version of the limits file: edits apply without reloading the model
+        return LIMITS.get(self.limits_path)
 
     def decode_qr(self, image):
         """
@@ -34,13 +52,95 @@ class QRValidator:
             "bbox": [1200, 800, 1450, 1050],
         }
 
-def validate_qr_code(image, check_limits=False):
+    def decode_opencv(self, image):
+        """OpenCV QRCodeDetector decode. Returns the text and the exact bbox of the found corners."""
+        text, points, _ = self.fast_detector.detectAndDecode(image)
+        if not text or points is None:
+            raise RuntimeError("No QR code detected")
+        return {"text": text, "bbox": _points_bbox(points)}
+
+    def decode_tiered(self, image, exact=False):
+        """
+        Tries each configured (engine, scale) tier in order until one decodes.
+        The bbox is returned in the coordinates of the given image; codes found
+        on a downscaled copy are re-located at full resolution. With exact (the
+        position check) a downscaled find that cannot be re-located is skipped
+        in favour of the next tier rather than reported with an upscaled bbox.
+        """
+        for engine, scale in self.tiers:
+            scaled = image if scale == 1.0 else cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            decode = self.decode_opencv if engine == "opencv" else self.decode_qr
+            try:
+                result = decode(scaled)
+            except RuntimeError:
+                continue
+            if not result.get("text"):
+                continue
+
+            bbox = result.get("bbox")
+            if bbox and scale != 1.0:
+                approx = [v / scale for v in bbox]
+                bbox = self._refine_bbox(image, approx, scale, decode if exact else None)
+                if bbox is None:
+                    if exact:
+                        continue
+                    bbox = [int(round(v)) for v in approx]
+            return dict(result, bbox=bbox, tier=f"{engine}@{scale:g}")
+
+        raise RuntimeError("No QR code detected")
+
+    def _refine_bbox(self, image, approx_bbox, scale, decode=None):
+        """
+        Locates the code at full resolution around a bbox found on a downscaled image,
+        falling back to decode (the tier's own decoder) on the full-resolution crop.
+        Returns None when it cannot be located there.
+        """
+        pad = int(2 / scale) + CONFIG.QR_REFINE_PADDING
+        view, offset = crop(image, approx_bbox, pad=pad)
+        if not view.size:
+            # The upscaled box can fall outside the frame, leaving nothing to search
+            return None
+        found, points = self.fast_detector.detect(view)
+        if found and points is not None:
+            return map_bbox(_points_bbox(points), offset)
+        if decode is not None:
+            try:
+                bbox = decode(view).get("bbox")
+            except RuntimeError:
+                bbox = None
+            if bbox:
+                return map_bbox(bbox, offset)
+        return None
+
+def _points_bbox(points):
+    pts = np.asarray(points).reshape(-1, 2)
+    return [int(round(pts[:, 0].min())), int(round(pts[:, 1].min())), int(round(pts[:, 0].max())), int(round(pts[:, 1].max()))]
+
+# Process-wide validator, built once per worker by the inference pool initializer
+_validator = None
+
+def get_validator():
+    """Returns the QRValidator instance of this process, building it on first use."""
+    global _validator
+    if _validator is None:
+        _validator = QRValidator("config/qr_limits.json")
+    return _validator
+
+def validate_qr_code(image, check_limits=False, roi_stage=None, artwork_id=None):
     """
     For checking readbility of the QR code. If check_limits == True,
-    then also checks if bounding box is within permissible limits
+    then also checks if bounding box is within permissible limits.
+    Decodes the expected QR region first; the bbox is always in full-frame coordinates.
     """
-    validator = QRValidator("config/qr_limits.json")
-    result = validator.decode_qr(image)
+    validator = get_validator()
+    frame = load_frame(image)
+    stage = roi_stage or ("meter_qr" if check_limits else "nic_qr")
+    window = stage_window(stage, validator.limits, artwork_regions(artwork_id))
+    # The position check needs the bbox at full resolution, not upscaled from a reduced tier
+    decode = lambda img: validator.decode_tiered(img, exact=check_limits)
+    result, offset = run_on_roi(frame, window, decode, lambda r: bool(r.get("text")))
+    if result.get("bbox"):
+        result = dict(result, bbox=map_bbox(result["bbox"], offset))
     
     # Check if text was successfully extracted
     if not result.get("text"):
@@ -49,11 +149,13 @@ def validate_qr_code(image, check_limits=False):
     response = {
         "codes": [result["text"]],
         "error": None,
-        "position_ok": True
+        "position_ok": True,
+        "bbox": result.get("bbox"),
+        "tier": result.get("tier")
     }
 
     if check_limits:
-        limits = validator.limits.get("qr_limits", {})
+        limits = qr_bounds(validator.limits, stage) or {}
         
         # (Position validation logic)
         position_ok = False
@@ -0,0 +1,96 @@
+"""
+Adaptive sensor warm-up.
+Reads frames until cheap statistics settle instead of using fixed frame counts
+and sleeps. Statistics are taken on a subsampled grid so each check costs a few
+hundred microseconds even on full-resolution frames.
+"""
+
+import time
+import numpy as np
+from config_loader import CONFIG
+from metrics import observe
+
+# Latest warm-up report per device, served on GET /camera_health
+LAST_REPORTS = {}
+
+
+def frame_stats(frame, step=16):
+    """
+    Returns (brightness, sharpness, grid) for a frame. The grid is a subsampled
+    single-channel int16 view used for frame-to-frame differences.
+    """
+    grid = frame[::step, ::step]
+    if grid.ndim == 3:
+        # Green channel is a cheap stand-in for luma
+        grid = grid[:, :, 1]
+    grid = grid.astype(np.int16)
+
+    brightness = float(grid.mean())
+    # Mean absolute neighbour gradient as a sharpness proxy
+    sharpness = float(np.abs(np.diff(grid, axis=1)).mean()) if grid.shape[1] > 1 else 0.0
+    return brightness, sharpness, grid
+
+def adaptive_warmup(cap, device, deadline_ms, preview=None, preview_scale=1):
+    """
+    Reads from an open capture until brightness, frame difference and sharpness
+    are stable for WARMUP_STABLE_FRAMES consecutive frames, or the deadline passes.
+    Returns (frame, report) where frame is the last good frame (or None).
+
+    For captures that return undecoded buffers, preview(frame) gives the image the
+    statistics are taken on, at 1/preview_scale resolution; the returned frame stays raw.
+    """
+    tolerances = CONFIG.warmup
+    brightness_tol = tolerances["brightness_tol"]
+    diff_tol = tolerances["diff_tol"]
+    sharpness_tol = tolerances["sharpness_tol"]
+    stable_needed = tolerances["stable_frames"]
+    min_brightness = tolerances["min_brightness"]
+    # Keep the sampling grid the same in full-frame pixels when judging a reduced preview
+    step = max(tolerances["grid_step"] // preview_scale, 1)
+
+    start = time.monotonic()
+    deadline = start + deadline_ms / 1000.0
+    frames = 0
+    stable = 0
+    prev = None
+    frame = None
+    settled = False
+
+    while time.monotonic() < deadline:
+        ret, current = cap.read()
+        frames += 1
+        if not ret or current is None:
+            stable = 0
+            continue
+        image = preview(current) if preview else current
+        if image is None:
+            stable = 0
+            continue
+        frame = current
+
+        stats = frame_stats(image, step)
+        if prev is not None and stats[0] >= min_brightness:
+            p_brightness, p_sharpness, p_grid = prev
+            brightness, sharpness, grid = stats
+            diff = float(np.abs(grid - p_grid).mean())
+            sharp_change = abs(sharpness - p_sharpness) / max(p_sharpness, 1e-6)
+
+            if abs(brightness - p_brightness) <= brightness_tol and diff <= diff_tol and sharp_change <= sharpness_tol:
+                stable += 1
+            else:
+                stable = 0
+        prev = stats
+
+        if stable >= stable_needed:
+            settled = True
+            break
+
+    elapsed = time.monotonic() - start
+    observe("warmup", elapsed)
+    report = {
+        "frames": frames,
+        "ms": round(elapsed * 1000, 1),
+        "settled": settled
+    }
+    LAST_REPORTS[device] = report
+    return frame, report
@@ -0,0 +1,310 @@
+"""
+Long-lived inference worker pool.
+Each worker process loads the vision models and limits files once through the
+pool initializer and reuses them for every job. Workers are recycled after a
+configurable number of jobs or when their memory grows past a limit.
+Workers report each model they load back to the pool, so preload progress can
+be shown while the API is already serving.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+import concurrent.futures
+from config_loader import CONFIG
+from metrics import observe
+
+
+# Set in each worker process by _bootstrap
+_progress_queue = None
+
+def report_progress(step, state, seconds=None):
+    """Reports a preload step of this worker ("loading", "ready" or "failed") to the pool."""
+    if _progress_queue is not None:
+        _progress_queue.put((os.getpid(), step, state, seconds))
+
+def _bootstrap(progress_queue, initializer, initargs):
+    """Runs the real initializer in a worker, bracketed by progress reports."""
+    global _progress_queue
+    _progress_queue = progress_queue
+    # Pin the worker and cap its intra-op threads before any framework starts its pools
+    from resources import get_plan
+    get_plan().apply_worker()
+    # Each worker watches the settings and limits files itself, so edits reach loaded models
+    CONFIG.watch()
+    start = time.monotonic()
+    report_progress("worker", "loading")
+    try:
+        initializer(*initargs)
+    except Exception:
+        report_progress("worker", "failed", time.monotonic() - start)
+        raise
+    report_progress("worker", "ready", time.monotonic() - start)
+
+def _load_model(step, build):
+    start = time.monotonic()
+    report_progress(step, "loading")
+    try:
+        build()
+    except Exception:
+        report_progress(step, "failed", time.monotonic() - start)
+        raise
+    report_progress(step, "ready", time.monotonic() - start)
+
+def _init_worker():
+    """
+    Pool initializer: builds every model once so jobs start on warm weights.
+    Frameworks are imported by the model constructors; with PRELOAD_PARALLEL they
+    load side by side, overlapping file I/O and native initialization.
+    """
+    from vision_logo import get_detector
+    from vision_ocr import get_ocr_engine
+    from vision_qr import get_validator
+
+    loaders = (("yolo", get_detector), ("ocr", get_ocr_engine), ("qr", get_validator))
+    if not CONFIG.PRELOAD_PARALLEL:
+        for step, build in loaders:
+            _load_model(step, build)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(loaders)) as loader:
+        for future in [loader.submit(_load_model, step, build) for step, build in loaders]:
+            future.result()
+
+def _worker_rss_mb():
+    """Resident memory of the current process in MB, read from /proc."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+def _run_job(fn, args, kwargs):
+    """
+    Runs a job inside a worker and reports the worker's pid, memory and start/end
+    times alongside the result. CLOCK_MONOTONIC is shared by all processes on the host.
+    """
+    started = time.monotonic()
+    result = fn(*args, **kwargs)
+    return result, os.getpid(), _worker_rss_mb(), started, time.monotonic()
+
+def _probe(delay):
+    """Warm-up probe; the initializer has already run by the time this executes."""
+    time.sleep(delay)
+    return os.getpid()
+
+
+class InferencePool:
+    def __init__(self, max_workers=4, max_jobs=0, max_rss_mb=0, warmup_timeout=120, initializer=_init_worker, initargs=()):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.warmup_timeout = warmup_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._executor = None
+        self._jobs_per_worker = {}
+        self._recycling = False
+        self.generation = 0
+        self.recycle_count = 0
+        self.last_error = None
+
+        # Preload progress of the generation being built: {pid: {step: {"state", "seconds"}}}
+        self._progress_queue = multiprocessing.Queue()
+        self._progress = {}
+        self._progress_started = None
+        self._listener = None
+
+    def worker_pids(self):
+        """Pids of the serving generation's worker processes."""
+        with self._lock:
+            executor = self._executor
+        if executor is None:
+            return []
+        return sorted(getattr(executor, "_processes", None) or {})
+
+    def progress(self):
+        """Snapshot of model preloading per worker of the current or upcoming generation."""
+        with self._lock:
+            workers = {str(pid): {step: dict(info) for step, info in steps.items()} for pid, steps in self._progress.items()}
+            started = self._progress_started
+        ready = sum(1 for steps in workers.values() if steps.get("worker", {}).get("state") == "ready")
+        return {
+            "ready": self.is_ready(),
+            "workers_ready": ready,
+            "workers_expected": self.max_workers,
+            "elapsed_s": round(time.monotonic() - started, 1) if started is not None else None,
+            "workers": workers,
+            "error": self.last_error
+        }
+
+    def _listen(self):
+        while True:
+            pid, step, state, seconds = self._progress_queue.get()
+            with self._lock:
+                self._progress.setdefault(pid, {})[step] = {"state": state, "seconds": None if seconds is None else round(seconds, 2)}
+
+    def start(self, wait=False):
+        """Spawns and warms the workers in the background. Safe to call more than once."""
+        with self._lock:
+            if self._executor is not None or self._recycling:
+                return
+            self._recycling = True
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="inference-pool-progress", daemon=True)
+                self._listener.start()
+
+        thread = threading.Thread(target=self._build_generation, name="inference-pool-warmup", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def submit(self, fn, *args, **kwargs):
+        """Submits a job to the warm workers and returns a future for its plain result."""
+        with self._lock:
+            executor = self._executor
+        if executor is None:
+            raise RuntimeError("Inference pool is not ready")
+
+        outer = concurrent.futures.Future()
+        submitted = time.monotonic()
+        inner = executor.submit(_run_job, fn, args, kwargs)
+        inner.add_done_callback(lambda f: self._on_job_done(f, outer, fn.__name__, submitted))
+        # Cancelling the returned future withdraws the job if no worker has picked it up yet
+        outer.add_done_callback(lambda f: f.cancelled() and inner.cancel())
+        return outer
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        self._ready.clear()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _on_job_done(self, inner, outer, task, submitted):
+        if inner.cancelled():
+            outer.cancel()
+            return
+
+        exc = inner.exception()
+        if exc is not None:
+            if isinstance(exc, concurrent.futures.process.BrokenProcessPool):
+                self._schedule_recycle(f"Broken pool: {exc}")
+            if not outer.done():
+                outer.set_exception(exc)
+            return
+
+        result, pid, rss_mb, started, finished = inner.result()
+        # Queue wait includes pickling the arguments, transfer includes unpickling the result
+        observe("queue_wait", started - submitted, task=task)
+        observe("inference", finished - started, task=task)
+        observe("result_transfer", time.monotonic() - finished, task=task)
+        if not outer.done():
+            outer.set_result(result)
+
+        with self._lock:
+            jobs = self._jobs_per_worker.get(pid, 0) + 1
+            self._jobs_per_worker[pid] = jobs
+
+        if self.max_jobs and jobs >= self.max_jobs:
+            self._schedule_recycle(f"Worker {pid} reached {jobs} jobs")
+        elif self.max_rss_mb and rss_mb >= self.max_rss_mb:
+            self._schedule_recycle(f"Worker {pid} uses {rss_mb:.0f} MB")
+
+    def _schedule_recycle(self, reason):
+        """Warms a replacement generation in the background; the current one keeps serving until the swap."""
+        with self._lock:
+            if self._recycling:
+                return
+            self._recycling = True
+        print(f"Recycling inference workers: {reason}")
+        threading.Thread(target=self._build_generation, name="inference-pool-recycle", daemon=True).start()
+
+    def _build_generation(self):
+        with self._lock:
+            self._progress = {}
+            self._progress_started = time.monotonic()
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_bootstrap,
+            initargs=(self._progress_queue, self.initializer, self.initargs)
+        )
+        try:
+            self._warm(executor)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Inference Pool Warm-up Error: {e}")
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._recycling = False
+            return
+
+        with self._lock:
+            old, self._executor = self._executor, executor
+            self._jobs_per_worker = {}
+            self._recycling = False
+            self.generation += 1
+            if old is not None:
+                self.recycle_count += 1
+        self.last_error = None
+        self._ready.set()
+
+        # In-flight jobs on the old generation still complete before its workers exit
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def _warm(self, executor):
+        """Blocks until every worker process has finished its initializer."""
+        deadline = time.monotonic() + self.warmup_timeout
+        seen = set()
+        while len(seen) < self.max_workers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Only {len(seen)}/{self.max_workers} workers warmed up")
+            probes = [executor.submit(_probe, 0.05) for _ in range(self.max_workers)]
+            for pid in concurrent.futures.as_completed(probes, timeout=remaining):
+                seen.add(pid.result())
+
+
+# Singleton pool shared by the API and the processor
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool(**overrides):
+    """
+    Returns the process-wide inference pool, configured from hawk_settings.conf.
+    Keyword overrides (e.g. max_workers) apply only when the pool is first created.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = {
+                "max_workers": CONFIG.INFERENCE_WORKERS,
+                "max_jobs": CONFIG.WORKER_MAX_JOBS,
+                "max_rss_mb": CONFIG.WORKER_MAX_RSS_MB,
+                "warmup_timeout": CONFIG.WORKER_WARMUP_TIMEOUT
+            }
+            settings.update(overrides)
+            _pool = InferencePool(**settings)
+        return _pool
+
+def _apply_settings(settings):
+    """Recycling limits and the warm-up timeout follow config reloads; the worker count needs a restart."""
+    if _pool is not None:
+        _pool.max_jobs = settings.WORKER_MAX_JOBS
+        _pool.max_rss_mb = settings.WORKER_MAX_RSS_MB
+        _pool.warmup_timeout = settings.WORKER_WARMUP_TIMEOUT
+
+CONFIG.subscribe(_apply_settings)
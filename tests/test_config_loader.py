@@ -0,0 +1,49 @@
+"""Settings loading from the file HAWK_CONFIG names."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(REPO, "src"))
+os.environ.setdefault("HAWK_CONFIG", os.path.join(REPO, "config", "hawk_settings.conf"))
+
+from config_loader import CONFIG, Config, Limits, ConfigError
+
+
+class ConfigLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "hawk_settings.conf")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, text):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_repo_settings_load_through_hawk_config(self):
+        self.assertEqual(os.path.abspath(CONFIG.path), os.path.abspath(os.environ["HAWK_CONFIG"]))
+        self.assertEqual(CONFIG.resolution, (CONFIG.WIDTH, CONFIG.HEIGHT))
+
+    def test_schema_supplies_defaults(self):
+        self._write("WIDTH=1920\nHEIGHT=1080\n")
+        config = Config(self.path, Limits())
+        self.assertEqual(config.resolution, (1920, 1080))
+        self.assertEqual(config.ROI_PADDING, 64)
+
+    def test_unknown_key_is_rejected(self):
+        self._write("PIXEL_VAL_THRESHHOLD=3\n")
+        with self.assertRaisesRegex(ConfigError, "PIXEL_VAL_THRESHOLD"):
+            Config(self.path, Limits())
+
+    def test_missing_file_fails_loudly(self):
+        with self.assertRaisesRegex(ConfigError, "HAWK_CONFIG"):
+            Config(os.path.join(self.root, "missing.conf"), Limits())
+
+
+if __name__ == "__main__":
+    unittest.main()
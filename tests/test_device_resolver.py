@@ -0,0 +1,120 @@
+"""DeviceResolver against a fake sysfs / udev tree."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from device_resolver import DeviceResolver
+
+METER_PORT = "pci-0000:00:14.0-usb-0:2:1.0"
+NIC_PORT = "pci-0000:00:14.0-usb-0:9:1.0"
+
+
+class FakeTree:
+    """A sys/class/video4linux tree whose entries link to USB interface directories."""
+
+    def __init__(self, root):
+        self.root = root
+        self.class_dir = os.path.join(root, "sys", "class", "video4linux")
+        self.udev_dir = os.path.join(root, "run", "udev", "data")
+        os.makedirs(self.class_dir)
+        os.makedirs(self.udev_dir)
+
+    def add(self, name, port, index=0):
+        """video<N> on USB port path "port" of bus 1 behind the 0000:00:14.0 controller."""
+        interface = os.path.join(self.root, "sys", "devices", "pci0000:00", "0000:00:14.0",
+                                 "usb1", f"1-{port}", f"1-{port}:1.0")
+        os.makedirs(interface, exist_ok=True)
+        entry = os.path.join(self.class_dir, name)
+        os.makedirs(entry)
+        os.symlink(interface, os.path.join(entry, "device"))
+        self._write(os.path.join(entry, "index"), str(index))
+        self._write(os.path.join(entry, "dev"), f"81:{name[5:]}")
+
+    def relink(self, name, port):
+        link = os.path.join(self.class_dir, name, "device")
+        os.remove(link)
+        interface = os.path.join(self.root, "sys", "devices", "pci0000:00", "0000:00:14.0",
+                                 "usb1", f"1-{port}", f"1-{port}:1.0")
+        os.makedirs(interface, exist_ok=True)
+        os.symlink(interface, link)
+
+    def remove(self, name):
+        shutil.rmtree(os.path.join(self.class_dir, name))
+
+    def udev_record(self, devnum, id_path):
+        self._write(os.path.join(self.udev_dir, f"c{devnum}"), f"S:v4l/by-path/{id_path}-video-index0\nE:ID_PATH={id_path}\n")
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+
+class DeviceResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.tree = FakeTree(self.root)
+        self.resolver = DeviceResolver(
+            sys_root=os.path.join(self.root, "sys"),
+            dev_root="/dev",
+            udev_data_root=self.tree.udev_dir,
+            use_udevadm=False
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_maps_id_path_to_capture_node(self):
+        # Each UVC camera has a capture node (index 0) and a metadata node (index 1)
+        self.tree.add("video0", "2", index=0)
+        self.tree.add("video1", "2", index=1)
+        self.tree.add("video2", "9", index=0)
+        self.tree.add("video3", "9", index=1)
+
+        self.assertEqual(self.resolver.mapping(), {METER_PORT: "/dev/video0", NIC_PORT: "/dev/video2"})
+        self.assertEqual(self.resolver.resolve(NIC_PORT), "/dev/video2")
+
+    def test_missing_camera_resolves_to_none(self):
+        self.tree.add("video0", "2")
+        self.assertIsNone(self.resolver.resolve(NIC_PORT))
+
+    def test_udev_database_takes_precedence(self):
+        self.tree.add("video0", "2")
+        self.tree.udev_record("81:0", NIC_PORT)
+        self.assertEqual(self.resolver.resolve(NIC_PORT), "/dev/video0")
+
+    def test_cache_is_reused_until_the_device_set_changes(self):
+        self.tree.add("video0", "2")
+        self.resolver.mapping()
+        self.resolver.mapping()
+        self.assertEqual(self.resolver.rebuilds, 1)
+
+        # Unplug and re-enumerate under new node numbers
+        self.tree.remove("video0")
+        self.tree.add("video4", "2")
+        self.assertEqual(self.resolver.resolve(METER_PORT), "/dev/video4")
+        self.assertEqual(self.resolver.rebuilds, 2)
+
+    def test_invalidate_rebuilds_after_hub_reset(self):
+        self.tree.add("video0", "2")
+        self.tree.add("video2", "9")
+        self.assertEqual(self.resolver.resolve(METER_PORT), "/dev/video0")
+
+        # After a hub power cycle the cameras came back on the same nodes but in swapped order,
+        # which leaves the device-set signature unchanged
+        self.tree.relink("video0", "9")
+        self.tree.relink("video2", "2")
+        self.assertEqual(self.resolver.resolve(METER_PORT), "/dev/video0")
+
+        self.resolver.invalidate()
+        self.assertEqual(self.resolver.mapping(), {METER_PORT: "/dev/video2", NIC_PORT: "/dev/video0"})
+        self.assertEqual(self.resolver.rebuilds, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
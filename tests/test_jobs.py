@@ -0,0 +1,100 @@
+"""Job registry: retry settling when parts overlap, and long-poll waits."""
+
+import os
+import sys
+import time
+import threading
+import unittest
+import concurrent.futures
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(REPO, "src"))
+os.environ.setdefault("HAWK_CONFIG", os.path.join(REPO, "config", "hawk_settings.conf"))
+
+from jobs import JobRegistry, DONE, FAILED, RETRY_PENDING
+
+
+def _result(success):
+    future = concurrent.futures.Future()
+    future.set_result({"response": {"data": {"success": success, "reason": "" if success else "OCR: mismatch"}}})
+    return future
+
+
+class OverlappingRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.jobs = JobRegistry(max_active=2)
+
+    def test_failed_first_result_waits_for_retry(self):
+        job = self.jobs.create({})
+        job.attach(_result(False))
+        self.assertEqual(job.state, RETRY_PENDING)
+        self.assertFalse(self.jobs.superseded(job))
+
+    def test_next_part_supersedes_pending_retry(self):
+        first = self.jobs.create({})
+        first.attach(_result(False))
+        second = self.jobs.create({})
+
+        self.assertTrue(self.jobs.superseded(first))
+        self.assertFalse(self.jobs.superseded(second))
+
+        # What _start_retry does instead of re-capturing: the first verdict stands
+        first.retry_attempted = True
+        first.settle()
+        self.assertEqual(first.state, DONE)
+        self.assertIsNone(first.retry_future)
+        self.assertFalse(first.future.result()["response"]["data"]["success"])
+        self.assertEqual(first.events[-1]["event"], "retry_skipped")
+
+    def test_settled_job_frees_its_slot(self):
+        first = self.jobs.create({})
+        first.attach(_result(False))
+        self.jobs.create({})
+        self.assertIsNone(self.jobs.create({}))
+
+        first.settle()
+        self.assertIsNotNone(self.jobs.create({}))
+
+
+class LongPollWaitTest(unittest.TestCase):
+    def setUp(self):
+        self.job = JobRegistry().create({})
+
+    def _later(self, delay, fn, *args):
+        timer = threading.Timer(delay, fn, args)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_wait_returns_on_first_success(self):
+        future = concurrent.futures.Future()
+        self.job.attach(future)
+        self._later(0.05, future.set_result, {"response": {"data": {"success": True}}})
+        start = time.monotonic()
+        self.assertTrue(self.job.wait(5))
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_wait_spans_the_retry(self):
+        self.job.attach(_result(False))
+        retry = concurrent.futures.Future()
+        # Retry starts, then finishes; the wait only returns with the retry's verdict
+        self._later(0.05, self.job.attach, retry, True)
+        self._later(0.1, retry.set_result, {"response": {"data": {"success": True}}})
+        self.assertTrue(self.job.wait(5))
+        self.assertEqual(self.job.state, DONE)
+        self.assertTrue(self.job.retry_future.done())
+
+    def test_wait_wakes_on_failure(self):
+        self.job.attach(concurrent.futures.Future())
+        self._later(0.05, self.job.fail, "Hardware Failure")
+        self.assertTrue(self.job.wait(5))
+        self.assertEqual(self.job.state, FAILED)
+
+    def test_wait_is_capped(self):
+        self.job.attach(concurrent.futures.Future())
+        start = time.monotonic()
+        self.assertFalse(self.job.wait(0.1))
+        self.assertLess(time.monotonic() - start, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Pipeline scheduling against a stub inference pool: decision order and stage-aware retries."""
+
+import os
+import sys
+import threading
+import unittest
+import concurrent.futures
+from unittest import mock
+import numpy as np
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(REPO, "src"))
+os.environ.setdefault("HAWK_CONFIG", os.path.join(REPO, "config", "hawk_settings.conf"))
+
+import processor
+from processor import run_pipeline, stages_to_retry, cameras_for
+from station import STATION
+
+PASS = {"status": "PASS", "error": None}
+FAIL = {"status": "FAIL", "error": "mismatch"}
+DATA = {"header": {"cmdCode": 3}, "data": {"idealArtworkPath": None}}
+
+
+def _results(logos=PASS, positions=PASS, nic_qr=True, meter_qr=True, ocr=PASS):
+    """Worker results by roi_stage, i.e. by task of the two-camera preset."""
+    return {
+        "nic_logos": {"logos": logos, "positions": positions, "detections": []},
+        "nic_qr": {"codes": ["N1"] if nic_qr else [], "error": None},
+        "meter_qr": {"codes": ["M1"] if meter_qr else [], "position_ok": meter_qr, "error": None},
+        "meter_ocr": ocr,
+    }
+
+
+class StubPool:
+    """Answers each task after its delay (seconds) from a timer thread; records what was submitted."""
+
+    def __init__(self, results, delays=None):
+        self.results = results
+        self.delays = delays or {}
+        self.submitted = []
+        self.cancelled = []
+
+    def is_ready(self):
+        return True
+
+    def submit(self, fn, *args, **kwargs):
+        stage = kwargs["roi_stage"]
+        self.submitted.append(stage)
+        future = concurrent.futures.Future()
+        future.add_done_callback(lambda f: f.cancelled() and self.cancelled.append(stage))
+
+        def resolve():
+            if future.set_running_or_notify_cancel():
+                future.set_result(self.results[stage])
+
+        timer = threading.Timer(self.delays.get(stage, 0), resolve)
+        timer.daemon = True
+        timer.start()
+        return future
+
+
+@unittest.skipUnless(STATION.preset, "stage names of the two-camera preset")
+class SchedulerTest(unittest.TestCase):
+    def _run(self, pool, frames=None, **kwargs):
+        frames = frames if frames is not None else {camera: np.zeros((8, 8, 3), np.uint8) for camera in STATION.names()}
+        with mock.patch.object(processor, "get_pool", return_value=pool), \
+             mock.patch.object(processor, "get_batcher", return_value=None):
+            return run_pipeline(frames, DATA, collect_all=False, **kwargs)
+
+    def test_later_failure_waits_for_earlier_stages(self):
+        # meter_ocr (last in decision order) fails first; niclogos fails later and must decide the part
+        pool = StubPool(_results(logos=FAIL, ocr=FAIL), delays={"nic_logos": 0.2})
+        result = self._run(pool)
+        self.assertFalse(result["response"]["data"]["success"])
+        self.assertFalse(result["response"]["data"]["niclogos"])
+        self.assertTrue(result["response"]["data"]["meter_ocr"])
+        self.assertEqual(result["response"]["data"]["reason"], "Logo: mismatch")
+
+    def test_later_failure_decides_once_earlier_stages_pass(self):
+        pool = StubPool(_results(ocr=FAIL), delays={"nic_logos": 0.1})
+        result = self._run(pool)
+        self.assertFalse(result["response"]["data"]["meter_ocr"])
+        self.assertIn("niclogos", result["outcomes"])
+
+    def test_early_failure_cancels_slow_tasks(self):
+        pool = StubPool(_results(logos=FAIL), delays={"meter_ocr": 5})
+        result = self._run(pool)
+        self.assertFalse(result["response"]["data"]["niclogos"])
+        self.assertNotIn("meter_ocr", result["outcomes"])
+        self.assertIn("meter_ocr", pool.cancelled)
+
+    def test_retry_reruns_only_failed_stages(self):
+        first = self._run(StubPool(_results(meter_qr=False), delays={"meter_qr": 0.1}))
+        self.assertFalse(first["response"]["data"]["success"])
+
+        stages = stages_to_retry(first["outcomes"])
+        self.assertEqual(stages, ["meter_qr"])
+        self.assertEqual(cameras_for(stages), ("meter",))
+
+        # Only the meter is re-captured; the NIC frame is absent and its stages come from prior
+        pool = StubPool(_results())
+        retry = self._run(pool, frames={"meter": np.zeros((8, 8, 3), np.uint8)}, stages=stages, prior=first["outcomes"])
+        self.assertEqual(pool.submitted, ["meter_qr"])
+        self.assertTrue(retry["response"]["data"]["success"])
+        self.assertEqual(set(retry["outcomes"]), {name for name, _, _, _ in processor.STAGES})
+        self.assertTrue(all(outcome["passed"] for outcome in retry["outcomes"].values()))
+
+    def test_undecided_stages_are_retried(self):
+        outcomes = {"niclogos": {"passed": False, "reason": "Logo: mismatch"}, "nic_qr": {"passed": True, "reason": ""}}
+        stages = stages_to_retry(outcomes)
+        self.assertEqual(stages, ["niclogos", "nic_positions", "meter_qr", "meter_ocr"])
+        self.assertEqual(set(cameras_for(stages)), {"meter", "nic"})
+
+
+if __name__ == "__main__":
+    unittest.main()
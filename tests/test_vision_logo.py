@@ -0,0 +1,80 @@
+"""Layout detection on the region of interest, with the full-frame fallback."""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(REPO, "src"))
+os.environ.setdefault("HAWK_CONFIG", os.path.join(REPO, "config", "hawk_settings.conf"))
+
+from config_loader import CONFIG
+import vision_logo
+
+FRAME = np.zeros((480, 640, 3), np.uint8)
+LOGO = {"label": "logo_ce", "bbox": [110, 210, 140, 240], "conf": 0.9}
+BRAND = {"label": "brand_label", "bbox": [510, 55, 590, 95], "conf": 0.9}
+
+
+class FakeDetector:
+    """Sees the logos whose full-frame bbox lies inside the image it is given."""
+
+    def __init__(self, origin):
+        self.limits = {}
+        self.origin = origin
+        self.calls = []
+
+    def detect_and_process(self, image):
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        self.calls.append([image.shape[:2] for image in images])
+        results = []
+        for image in images:
+            x0, y0 = (0, 0) if image.shape == FRAME.shape else self.origin
+            height, width = image.shape[:2]
+            results.append([
+                dict(d, bbox=[d["bbox"][0] - x0, d["bbox"][1] - y0, d["bbox"][2] - x0, d["bbox"][3] - y0])
+                for d in (LOGO, BRAND)
+                if x0 <= d["bbox"][0] and d["bbox"][2] <= x0 + width and y0 <= d["bbox"][1] and d["bbox"][3] <= y0 + height
+            ])
+        return results
+
+
+def _artwork(labels):
+    return {
+        "regions": {"nic_logos": [100, 200, 150, 250]},
+        "position_windows": {label: {"x_range": [0, 640], "y_range": [0, 480]} for label in labels},
+    }
+
+
+class LayoutFallbackTest(unittest.TestCase):
+    def setUp(self):
+        pad = CONFIG.ROI_PADDING
+        self.detector = FakeDetector((100 - pad, 200 - pad))
+        self._saved, vision_logo._detector = vision_logo._detector, self.detector
+        self.addCleanup(setattr, vision_logo, "_detector", self._saved)
+
+    def test_logo_outside_window_uses_full_frame(self):
+        detections = vision_logo.detect_nic_logos(FRAME, _artwork(["logo_ce", "brand_label"]))
+        self.assertEqual(sorted(d["label"] for d in detections), ["brand_label", "logo_ce"])
+        self.assertIn(BRAND["bbox"], [d["bbox"] for d in detections])
+        self.assertEqual(len(self.detector.calls), 2)
+
+    def test_window_with_every_label_skips_full_frame(self):
+        detections = vision_logo.detect_nic_logos(FRAME, _artwork(["logo_ce"]))
+        self.assertEqual([d["bbox"] for d in detections], [LOGO["bbox"]])
+        self.assertEqual(len(self.detector.calls), 1)
+
+    def test_batch_falls_back_per_item(self):
+        items = [(FRAME, _artwork(["logo_ce", "brand_label"]), "nic_logos"), (FRAME, _artwork(["logo_ce"]), "nic_logos")]
+        first, second = vision_logo.detect_nic_logos_batch(items)
+        self.assertEqual(sorted(d["label"] for d in first), ["brand_label", "logo_ce"])
+        self.assertEqual([d["label"] for d in second], ["logo_ce"])
+        # One pass over both windows, then a full-frame pass for the first item only
+        self.assertEqual([len(call) for call in self.detector.calls], [2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()